@@ -0,0 +1,38 @@
+# Refactoring, Django 1.11 compatibility, cleanups, bugfixes (c) 2018 Christian Kreuzberger <ckreuzberger@anexia-it.com>
+# All rights reserved.
+#
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class BaseFragmentCache:
+    """Stores serialized D:response fragments of PROPFIND replies, so unchanged
+    resources don't need their properties computed and serialized again. Keys are
+    built by the view and already include a validator (etag or modification time)
+    of the resource, so entries never need explicit invalidation."""
+
+    def get(self, key):
+        """Return the cached fragment as bytes, or None on a miss."""
+        raise NotImplementedError()
+
+    def set(self, key, fragment):
+        """Store the fragment (bytes) under the given key."""
+        raise NotImplementedError()
@@ -24,13 +24,34 @@
 
 
 class BaseLock:
+    # (lockscope, locktype) pairs reported by the supportedlock property
+    supported_locks = [("exclusive", "write"), ("shared", "write")]
+
     def __init__(self, resource):
         self.resource = resource
 
     def get(self):
-        """Gets all active locks for the requested resource. Returns a list of locks."""
+        """Gets all active locks for the requested resource. Returns a list of locks,
+        dicts with the keys token, lockscope, locktype, depth (-1 for infinity),
+        timeout (seconds, None for infinite) and owner."""
         raise NotImplementedError()
 
+    @classmethod
+    def get_locks_for(cls, resources):
+        """Return the active locks of each of the resources, as get does. Used by
+        PROPFIND to report lockdiscovery for a whole listing; lock stores should
+        override this to look up all resources with a single query."""
+        return [cls(resource).get() or [] for resource in resources]
+
+    @classmethod
+    def get_tree_version(cls, resource, depth):
+        """Return a value that changes whenever a lock on the resource or one of its
+        descendants up to the given depth is acquired, refreshed or released, like
+        a change counter of the lock store. PROPFIND responses reporting
+        lockdiscovery only get a conditional ETag if the store provides one; the
+        default None means it can't tell without looking up every lock."""
+        return None
+
     def acquire(self, lockscope, locktype, depth, timeout, owner):
         """Creates a new lock for the given resource."""
         raise NotImplementedError()
@@ -24,11 +24,21 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from bisect import bisect_right
 from hashlib import md5
 from mimetypes import guess_type
 from urllib.parse import quote as urlquote
 
-from djangodav.utils import rfc1123_date, rfc3339_date, safe_join
+from djangodav.utils import get_property_list, rfc1123_date, rfc3339_date, safe_join
+
+
+def paginate_names(names, start_after=None, limit=None):
+    """Sort child names and return the page starting after start_after with at most
+    limit entries. Helper for backends that can only list a collection as a whole."""
+    names = sorted(names)
+    start = bisect_right(names, start_after) if start_after is not None else 0
+    end = start + limit if limit is not None else None
+    return names[start:end]
 
 
 class BaseDavResource:
@@ -129,11 +139,48 @@ class BaseDavResource:
         # https://www.rfc-editor.org/rfc/rfc4918#section-15.6
         raise NotImplementedError()
 
+    def get_properties(self, names=None):
+        """Return the requested properties (default ALL_PROPS) as a list of
+        (name, value) pairs, computing every property only once."""
+        return get_property_list(self, *(names or self.ALL_PROPS))
+
+    @classmethod
+    def bulk_properties(cls, resources, names=None):
+        """Return the properties of each of the resources, as get_properties does.
+        The resources are usually siblings listed by one PROPFIND, so backends can
+        override this to fetch the metadata of the whole set in one go."""
+        return [resource.get_properties(names) for resource in resources]
+
+    @classmethod
+    def bulk_prefetch(cls, resources):
+        """Load the backend state (existence, type) of many unrelated resources at
+        once, e.g. for the hrefs of a multiget REPORT. The default does nothing and
+        lets every resource look itself up."""
+
+    def get_tree_etag(self, depth=1):
+        """Return a validator that changes whenever this resource or one of its
+        descendants up to the given depth changes. The default implementation walks the
+        descendants and hashes their metadata; backends that maintain a change counter
+        for collections should override this to answer without listing children."""
+        hashsum = md5()
+        for resource in self.get_descendants(depth=depth):
+            hashsum.update(resource.get_escaped_path().encode())
+            try:
+                hashsum.update(str(resource.getetag).encode())
+            except NotImplementedError:
+                if resource.is_root:
+                    # backends may have no stored root, e.g. the db one returns now()
+                    continue
+                hashsum.update(str(resource.get_modified()).encode())
+                if resource.is_object:
+                    hashsum.update(str(resource.getcontentlength).encode())
+        return hashsum.hexdigest()
+
     def copy(self, destination, depth=-1):
         if self.is_collection:
             if not destination.exists or not destination.is_collection:
                 destination.create_collection()
-            self.copy_collection(destination, depth)
+            return self.copy_collection(destination, depth)
         else:
             if destination.is_object:
                 destination.delete()
@@ -143,7 +190,8 @@ class BaseDavResource:
         """Called to copy a resource to a new location. Overwrite is assumed, the DAV server
         will refuse to copy to an existing resource otherwise. This method needs to gracefully
         handle a pre-existing destination of any type. It also needs to respect the depth
-        parameter. depth == -1 is infinity."""
+        parameter. depth == -1 is infinity. Backends that keep going after a member
+        failed return a list of (resource, status) pairs describing the failures."""
         # If depth is less than 0, then it started out as -1.
         # We need to keep recursing until we hit 0, or forever
         # in case of infinity.
@@ -205,7 +253,10 @@ class BaseDavResource:
     def exists(self):
         raise NotImplementedError()
 
-    def get_children(self):
+    def get_children(self, start_after=None, limit=None):
+        """Return an iterator of the direct children of this resource. If start_after or
+        limit is given, children must be ordered by name, start after the child named
+        start_after and number at most limit, so collections can be listed in pages."""
         raise NotImplementedError()
 
     def delete(self):
@@ -21,7 +21,10 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from datetime import date, datetime, timedelta, timezone
+
 from django.test import TestCase
+from django.utils.feedgenerator import rfc2822_date
 from mock import Mock, patch
 
 from djangodav.base.resources import BaseDavResource
@@ -30,6 +33,7 @@ from djangodav.base.tests.resources import (
     MockCollection,
     MockObject,
 )
+from djangodav.utils import rfc1123_date, rfc3339_date
 
 
 class TestBaseDavResource(TestCase):
@@ -131,3 +135,44 @@ class TestBaseDavResource(TestCase):
 
         dst.create_collection.assert_called_with()
         self.assertEqual(child.copy.call_count, 0)
+
+    def test_tree_etag_root(self):
+        # a root without stored metadata, like the db one, reports a new time on
+        # every call
+        modified = iter(range(10))
+
+        class Resource(BaseDavResource):
+            is_object = False
+            is_collection = True
+
+            def get_children(self, start_after=None, limit=None):
+                return iter(())
+
+            def get_modified(self):
+                return next(modified)
+
+        root = Resource("/")
+        self.assertEqual(root.get_tree_etag(), root.get_tree_etag())
+        collection = Resource("/collection/")
+        self.assertNotEqual(collection.get_tree_etag(), collection.get_tree_etag())
+
+
+class TestDateFormatting(TestCase):
+    def test_memoized_dates(self):
+        naive = datetime(2014, 12, 24, 6, 0, 0, 1)
+        dates = [
+            naive,
+            naive.replace(microsecond=2),
+            naive.replace(tzinfo=timezone.utc),
+            naive.replace(tzinfo=timezone(timedelta(hours=1, minutes=30))),
+            naive.replace(tzinfo=timezone(timedelta(hours=-2))),
+            naive.replace(second=1),
+        ]
+        for _ in range(2):
+            for dt in dates:
+                self.assertEqual(rfc1123_date(dt), rfc2822_date(dt))
+                self.assertEqual(rfc3339_date(dt), dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        self.assertEqual(
+            rfc1123_date(date(2014, 12, 24)), rfc2822_date(date(2014, 12, 24))
+        )
+        self.assertEqual(rfc3339_date(None), "")
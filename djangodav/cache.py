@@ -0,0 +1,76 @@
+# Refactoring, Django 1.11 compatibility, cleanups, bugfixes (c) 2018 Christian Kreuzberger <ckreuzberger@anexia-it.com>
+# All rights reserved.
+#
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from djangodav.base.cache import BaseFragmentCache
+
+
+class LRUFragmentCache(BaseFragmentCache):
+    """In-process cache keeping the maxsize most recently used fragments."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.fragments = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.fragments.move_to_end(key)
+            except KeyError:
+                return None
+            return self.fragments[key]
+
+    def set(self, key, fragment):
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while len(self.fragments) > self.maxsize:
+                self.fragments.popitem(last=False)
+
+
+class DjangoFragmentCache(BaseFragmentCache):
+    """Stores fragments in one of the configured Django cache backends, which allows
+    sharing them between worker processes."""
+
+    def __init__(self, alias="default", timeout=None, key_prefix="djangodav"):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return "%s:%s" % (self.key_prefix, key)
+
+    def get(self, key):
+        return self.cache.get(self.make_key(key))
+
+    def set(self, key, fragment):
+        self.cache.set(self.make_key(key), fragment, self.timeout)
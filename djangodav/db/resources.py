@@ -25,8 +25,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 import logging
+from collections import defaultdict
 from functools import reduce
-from operator import and_
+from heapq import merge
+from itertools import chain, islice
+from operator import and_, attrgetter
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
@@ -93,23 +96,36 @@ class BaseDBDavResource(BaseDavResource):
     def get_model_kwargs(self, **kwargs):
         return kwargs
 
-    def get_children(self):
+    def get_children(self, start_after=None, limit=None):
         """Return an iterator of all direct children of this resource."""
         if not self.exists or isinstance(self.obj, self.object_model):
             return
 
+        paginate = start_after is not None or limit is not None
         querysets = [self.collection_model_qs, self.object_model_qs]
+        results = []
         for qs in querysets:
             # get kwargs for this model
             kwargs = self.get_model_lookup_kwargs(
                 **{self.collection_attribute: self.obj}
             )
-
-            for child in qs.filter(**kwargs):
-                yield self.clone(
-                    url_join(*(self.path + [child.name])),
-                    obj=child,  # Sending ready object to reduce db requests
-                )
+            qs = qs.filter(**kwargs)
+            if paginate:
+                if start_after is not None:
+                    qs = qs.filter(**{self.name_attribute + "__gt": start_after})
+                qs = qs.order_by(self.name_attribute)[:limit]
+            results.append(qs)
+
+        children = chain(*results)
+        if paginate:
+            children = islice(
+                merge(*results, key=attrgetter(self.name_attribute)), limit
+            )
+        for child in children:
+            yield self.clone(
+                url_join(*(self.path + [child.name])),
+                obj=child,  # Sending ready object to reduce db requests
+            )
 
     def read(self):
         raise NotImplementedError
@@ -174,6 +190,51 @@ class NameLookupDBDavMixIn:
             except ObjectDoesNotExist:
                 continue
 
+    @classmethod
+    def bulk_prefetch(cls, resources):
+        """Look up the objects of many resources with one query per model and
+        parent collection instead of one join per resource."""
+        siblings = defaultdict(list)
+        for resource in resources:
+            if resource.path and "obj" not in resource.__dict__:
+                siblings[tuple(resource.path[:-1])].append(resource)
+
+        for parent_path, children in siblings.items():
+            parent = None
+            if parent_path:
+                try:
+                    # only a collection can be a parent, e.g. not for /file.txt/x
+                    parent = children[0].clone("/".join(parent_path)).get_collection()
+                except ObjectDoesNotExist:
+                    for child in children:
+                        child.__dict__["obj"] = None
+                    continue
+            names = {child.path[-1] for child in children}
+            found = {}
+            for model_attr in ("object", "collection"):
+                qs = getattr(children[0], "%s_model_qs" % model_attr).filter(
+                    **children[0].get_model_lookup_kwargs(
+                        **{
+                            cls.collection_attribute: parent,
+                            cls.name_attribute + "__in": names,
+                        }
+                    )
+                )
+                found[model_attr] = {getattr(o, cls.name_attribute): o for o in qs}
+            for child in children:
+                if child.possible_collection:  # same preference as obj
+                    attempts = ["collection", "object"]
+                else:
+                    attempts = ["object", "collection"]
+                child.__dict__["obj"] = next(
+                    (
+                        found[attr][child.path[-1]]
+                        for attr in attempts
+                        if child.path[-1] in found[attr]
+                    ),
+                    None,
+                )
+
     def get_model_by_path(self, model_attr, path):
         if not path:
             return None
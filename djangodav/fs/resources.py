@@ -22,15 +22,85 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 import datetime
+import errno
+import logging
 import os
 import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from hashlib import file_digest, md5
+from hashlib import new as new_hash
+from operator import attrgetter
+from stat import S_ISDIR, S_ISREG
 from sys import getfilesystemencoding
+from uuid import uuid4
 
-from djangodav.base.resources import BaseDavResource
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from djangodav.base.resources import BaseDavResource, paginate_names
+from djangodav.fs.utils import (
+    DURABILITY_DIRECTORY,
+    DURABILITY_FILE,
+    DURABILITY_NONE,
+    UPLOAD_BUFFER_SIZE,
+    HashRing,
+    ShardIndex,
+    copy_file,
+    directory_sync,
+    error_status,
+    fsync_directory,
+    write_stream,
+)
 from djangodav.utils import url_join
 
 fs_encoding = getfilesystemencoding()
 
+log = logging.getLogger(__name__)
+
+# delete_tree works on directory file descriptors where the platform allows it
+DIR_FD_SUPPORTED = {
+    os.open,
+    os.rmdir,
+    os.unlink,
+} <= os.supports_dir_fd and os.scandir in os.supports_fd
+DIR_OPEN_FLAGS = (
+    os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+)
+
+DJANGODAV_FS_STAT_WORKERS = getattr(settings, "DJANGODAV_FS_STAT_WORKERS", None)
+DJANGODAV_FS_COPY_WORKERS = getattr(settings, "DJANGODAV_FS_COPY_WORKERS", 4)
+DJANGODAV_FS_TRASH = getattr(settings, "DJANGODAV_FS_TRASH", False)
+DJANGODAV_FS_ATOMIC_WRITE = getattr(settings, "DJANGODAV_FS_ATOMIC_WRITE", False)
+DJANGODAV_FS_DURABILITY = getattr(settings, "DJANGODAV_FS_DURABILITY", DURABILITY_NONE)
+DJANGODAV_FS_GROUP_COMMIT = getattr(settings, "DJANGODAV_FS_GROUP_COMMIT", False)
+DJANGODAV_FS_UPLOAD_BUFFER_SIZE = getattr(
+    settings, "DJANGODAV_FS_UPLOAD_BUFFER_SIZE", UPLOAD_BUFFER_SIZE
+)
+DJANGODAV_FS_UPLOAD_FADVISE = getattr(settings, "DJANGODAV_FS_UPLOAD_FADVISE", False)
+
+# uploads in progress are written to files with this prefix next to their target,
+# which are never listed
+TEMP_PREFIX = ".~djangodav-"
+
+
+def create_temp_file(directory):
+    """Create a new TEMP_PREFIX file in directory and return its file descriptor and
+    path. The file is created with mode 0666 minus the process umask, like files
+    opened for writing."""
+    while True:
+        path = os.path.join(directory, "%s%s.tmp" % (TEMP_PREFIX, uuid4().hex))
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), path
+        except FileExistsError:
+            continue
+
+
+# every trash entry is a directory holding the deleted resource and its original path
+TRASH_DATA = "data"
+TRASH_INFO = "info"
+
 
 class BaseFSDavResource(BaseDavResource):
     """Implements an interface to the file system. This can be subclassed to provide
@@ -38,6 +108,15 @@ class BaseFSDavResource(BaseDavResource):
     python's os library to do most of the work."""
 
     root = None
+    # stat the resources of a PROPFIND batch with up to this many threads, which pays
+    # off on network file systems where every stat is a round trip
+    stat_workers = DJANGODAV_FS_STAT_WORKERS
+    # number of threads copying files during a collection COPY
+    copy_workers = DJANGODAV_FS_COPY_WORKERS
+    # DELETE renames resources into the trash_name directory below the root, which is
+    # hidden from clients, and leaves the actual removal to purge_trash
+    use_trash = DJANGODAV_FS_TRASH
+    trash_name = ".trash"
 
     def get_abs_path(self):
         """Return the absolute path of the resource. Used internally to interface with
@@ -45,48 +124,134 @@ class BaseFSDavResource(BaseDavResource):
         be used."""
         return os.path.join(self.root, *self.path)
 
+    # the os.DirEntry this resource was listed from by get_children, if any
+    entry = None
+
+    @cached_property
+    def stat(self):
+        """The os.stat result of the resource, or None if it doesn't exist. All file
+        system properties are derived from it, so a resource costs a single stat call
+        until invalidate() is called."""
+        if self.in_trash:
+            return None
+        try:
+            if self.entry is not None:
+                return self.entry.stat()
+            return os.stat(self.get_abs_path())
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def in_trash(self):
+        """Return True if the path points into the trash, which clients can't see."""
+        return bool(self.use_trash and self.path[:1] == [self.trash_name])
+
+    def invalidate(self):
+        """Forget the cached stat result, after the resource has been changed."""
+        self.__dict__.pop("stat", None)
+        self.entry = None
+
+    @classmethod
+    def prefetch_stats(cls, resources):
+        """Load the stat results of the resources concurrently with a pool of at most
+        stat_workers threads. Entries that vanished in the meantime simply end up
+        as missing resources."""
+        pending = [r for r in resources if "stat" not in r.__dict__]
+        workers = min(cls.stat_workers or 0, len(pending))
+        if workers < 2:
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(attrgetter("stat"), pending):
+                pass
+
+    @classmethod
+    def bulk_properties(cls, resources, names=None):
+        cls.prefetch_stats(resources)
+        return super().bulk_properties(resources, names)
+
+    @classmethod
+    def bulk_prefetch(cls, resources):
+        """Stat all the resources, concurrently where stat_workers allows it. Their
+        directory entries aren't trusted here, so resources that vanished since they
+        were listed turn out missing."""
+        cls.prefetch_stats(resources)
+        for resource in resources:
+            resource.stat
+
+    def has_entry(self):
+        """Return True if the type of the resource is known from its directory entry
+        and no stat call is needed to tell a collection from an object."""
+        return self.entry is not None and "stat" not in self.__dict__
+
     @property
     def getcontentlength(self):
         """Return the size of the resource in bytes."""
-        return os.path.getsize(self.get_abs_path())
+        return self.stat.st_size
 
     def get_created(self):
         """Return the create time as datetime object."""
-        return datetime.datetime.fromtimestamp(os.stat(self.get_abs_path()).st_ctime)
+        return datetime.datetime.fromtimestamp(self.stat.st_ctime)
 
     def get_modified(self):
         """Return the modified time as datetime object."""
-        return datetime.datetime.fromtimestamp(os.stat(self.get_abs_path()).st_mtime)
+        return datetime.datetime.fromtimestamp(self.stat.st_mtime)
 
     @property
     def is_collection(self):
         """Return True if this resource is a directory (collection in WebDAV parlance)."""
-        return os.path.isdir(self.get_abs_path())
+        if self.has_entry():
+            return self.entry.is_dir()
+        return self.stat is not None and S_ISDIR(self.stat.st_mode)
 
     @property
     def is_object(self):
         """Return True if this resource is a file (resource in WebDAV parlance)."""
-        return os.path.isfile(self.get_abs_path())
+        if self.has_entry():
+            return self.entry.is_file()
+        return self.stat is not None and S_ISREG(self.stat.st_mode)
 
     @property
     def exists(self):
         """Return True if this resource exists."""
-        return os.path.exists(self.get_abs_path())
+        if self.has_entry():
+            return True
+        return self.stat is not None
 
-    def get_children(self):
-        """Return an iterator of all direct children of this resource."""
+    def get_children(self, start_after=None, limit=None):
+        """Return an iterator of all direct children of this resource. The children
+        carry the os.DirEntry they were listed from, so their type is known without
+        another stat call. Unless a page is asked for, the directory is streamed
+        rather than read into memory."""
         # make sure the current object is a directory
-        path = self.get_abs_path()
+        if not self.is_collection:
+            return
+        if start_after is None and limit is None:
+            with os.scandir(self.get_abs_path()) as it:
+                for entry in it:
+                    if not self.is_hidden(entry.name):
+                        yield self.get_child(entry.name, entry)
+            return
+        with os.scandir(self.get_abs_path()) as it:
+            entries = {entry.name: entry for entry in it}
+        names = [name for name in entries if not self.is_hidden(name)]
+        for name in paginate_names(names, start_after, limit):
+            yield self.get_child(name, entries[name])
 
-        if os.path.isdir(path):
-            for child in os.listdir(path):
-                try:
-                    is_unicode = isinstance(child, str)
-                except NameError:  # Python 3 fix
-                    is_unicode = isinstance(child, str)
-                if not is_unicode:
-                    child = child.decode(fs_encoding)
-                yield self.clone(url_join(*(self.path + [child])))
+    def get_child(self, name, entry=None):
+        """Return the child with the given name, listed from the os.DirEntry entry."""
+        if not isinstance(name, str):
+            name = name.decode(fs_encoding)
+        child = self.clone(url_join(*(self.path + [name])))
+        child.entry = entry
+        return child
+
+    def is_hidden(self, name):
+        """Return True if the child with the given name is internal to the backend,
+        like the trash at the root or a temporary upload file, and must not be
+        listed."""
+        if name.startswith(TEMP_PREFIX):
+            return True
+        return self.is_root and self.use_trash and name == self.trash_name
 
     def write(self, content, temp_file=None, range_start=None):
         raise NotImplementedError
@@ -95,23 +260,240 @@ class BaseFSDavResource(BaseDavResource):
         raise NotImplementedError
 
     def delete(self):
-        """Delete the resource, recursive is implied."""
+        """Delete the resource, recursive is implied. Returns the members of a
+        directory that couldn't be deleted as (resource, status) pairs, if any."""
+        if self.use_trash and not self.is_root and self.exists and self.move_to_trash():
+            return None
+        errors = None
         if self.is_collection:
-            for child in self.get_children():
-                child.delete()
-            os.rmdir(self.get_abs_path())
+            if DIR_FD_SUPPORTED:
+                errors = self.delete_tree()
+            else:
+                for child in self.get_children():
+                    child.delete()
+                os.rmdir(self.get_abs_path())
         elif self.is_object:
             os.remove(self.get_abs_path())
+        self.invalidate()
+        return errors
+
+    def delete_tree(self, rate=None, path=None):
+        """Remove this directory and everything below it, walking the tree with
+        os.scandir on directory file descriptors instead of creating a resource per
+        entry. A member that can't be removed doesn't stop the walk; it is returned
+        as a (resource, status) pair and its parent directories are left in place.
+        rate limits the number of entries removed per second, path overrides the
+        directory to remove (default get_abs_path())."""
+        errors = []
+        path = path or self.get_abs_path()
+
+        def throttle():
+            if rate:
+                time.sleep(1.0 / rate)
+
+        def delete_contents(fd, parts):
+            with os.scandir(fd) as it:
+                entries = list(it)
+            complete = True
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        child_fd = os.open(entry.name, DIR_OPEN_FLAGS, dir_fd=fd)
+                        try:
+                            emptied = delete_contents(child_fd, parts + [entry.name])
+                        finally:
+                            os.close(child_fd)
+                        if not emptied:
+                            complete = False
+                            continue
+                        os.rmdir(entry.name, dir_fd=fd)
+                    else:
+                        os.unlink(entry.name, dir_fd=fd)
+                    throttle()
+                except OSError as e:
+                    complete = False
+                    member = url_join(*(self.path + parts + [entry.name]))
+                    errors.append((self.clone(member), error_status(e)))
+            return complete
+
+        fd = os.open(path, DIR_OPEN_FLAGS)
+        try:
+            emptied = delete_contents(fd, [])
+        finally:
+            os.close(fd)
+        if emptied:
+            os.rmdir(path)
+        return errors
+
+    @classmethod
+    def get_trash_path(cls, *parts):
+        return os.path.join(cls.root, cls.trash_name, *parts)
+
+    def move_to_trash(self):
+        """Move the resource into the trash with a single rename and return the id of
+        the trash entry, or None if the trash is on another file system."""
+        trash_id = "%d-%s" % (time.time(), uuid4().hex)
+        os.makedirs(self.get_trash_path(trash_id))
+        with open(self.get_trash_path(trash_id, TRASH_INFO), "w") as f:
+            f.write(self.get_path())
+        try:
+            os.rename(self.get_abs_path(), self.get_trash_path(trash_id, TRASH_DATA))
+        except OSError as e:
+            shutil.rmtree(self.get_trash_path(trash_id))
+            if e.errno != errno.EXDEV:
+                raise
+            return None
+        self.invalidate()
+        return trash_id
+
+    @classmethod
+    def list_trash(cls):
+        """Return the entries in the trash as (trash id, original path, time of
+        deletion) tuples, oldest first."""
+        try:
+            with os.scandir(cls.get_trash_path()) as it:
+                trash_ids = sorted(entry.name for entry in it if entry.is_dir())
+        except FileNotFoundError:
+            return []
+        entries = []
+        for trash_id in trash_ids:
+            try:
+                with open(cls.get_trash_path(trash_id, TRASH_INFO)) as f:
+                    path = f.read()
+            except FileNotFoundError:
+                path = None
+            deleted = datetime.datetime.fromtimestamp(int(trash_id.split("-")[0]))
+            entries.append((trash_id, path, deleted))
+        return entries
+
+    @classmethod
+    def restore_trash(cls, trash_id, path=None):
+        """Move a trash entry back to its original path, or to path. Raises
+        FileExistsError if something was created there in the meantime."""
+        if path is None:
+            with open(cls.get_trash_path(trash_id, TRASH_INFO)) as f:
+                path = f.read()
+        resource = cls(path)
+        if resource.exists:
+            raise FileExistsError(errno.EEXIST, "Resource exists", path)
+        resource.restore_from(cls.get_trash_path(trash_id, TRASH_DATA))
+        shutil.rmtree(cls.get_trash_path(trash_id))
+        return resource
+
+    def restore_from(self, path):
+        """Move the file or directory at path into the place of this resource."""
+        os.rename(path, self.get_abs_path())
+        self.invalidate()
+
+    @classmethod
+    def purge_trash(cls, older_than=None, rate=None):
+        """Remove the trash entries deleted more than older_than seconds ago (all of
+        them by default), at most rate entries per second. Returns the ids of the
+        purged entries."""
+        purged = []
+        for trash_id, path, deleted in cls.list_trash():
+            if (
+                older_than is not None
+                and (datetime.datetime.now() - deleted).total_seconds() < older_than
+            ):
+                continue
+            if DIR_FD_SUPPORTED:
+                errors = cls("/%s/%s/" % (cls.trash_name, trash_id)).delete_tree(rate)
+            else:
+                shutil.rmtree(cls.get_trash_path(trash_id))
+                errors = None
+            if errors:
+                log.warning(
+                    "Purging %s from the trash failed for %d members", path, len(errors)
+                )
+                continue
+            purged.append(trash_id)
+        return purged
 
     def create_collection(self):
         """Create a directory in the location of this resource."""
         os.mkdir(self.get_abs_path())
+        self.invalidate()
+
+    def copy_collection(self, destination, depth=-1):
+        """Copy the tree below this directory. Directories are created in order by the
+        calling thread while a pool of copy_workers threads copies the files. A
+        member that fails is skipped, with its subtree, and the copy goes on; the
+        failures are returned as (resource, status) pairs."""
+        errors = []
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                source = pending.pop(future)
+                try:
+                    future.result()
+                except OSError as e:
+                    log.warning("Copying %s failed: %s", source.get_path(), e)
+                    errors.append((source, error_status(e)))
+
+        stack = [(self, destination, depth)]
+        with ThreadPoolExecutor(max_workers=max(self.copy_workers, 1)) as executor:
+            while stack:
+                source, target, depth = stack.pop()
+                if depth == 0:
+                    continue
+                try:
+                    children = list(source.get_children())
+                except OSError as e:
+                    errors.append((source, error_status(e)))
+                    continue
+                for child in children:
+                    child_target = target.clone(
+                        url_join(*(target.path + [child.displayname]))
+                    )
+                    if child.is_collection:
+                        try:
+                            child_target.create_collection()
+                        except FileExistsError:
+                            child_target.invalidate()
+                            if not child_target.is_collection:
+                                errors.append((child, "HTTP/1.1 409 Conflict"))
+                                continue
+                        except OSError as e:
+                            errors.append((child, error_status(e)))
+                            continue
+                        stack.append((child, child_target, depth - 1))
+                        continue
+                    pending[executor.submit(child.copy_object, child_target)] = child
+                    if len(pending) >= 4 * self.copy_workers:
+                        collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            collect(list(pending))
+        return errors
 
     def copy_object(self, destination, depth=0):
-        shutil.copy(self.get_abs_path(), destination.get_abs_path())
+        copy_file(self.get_abs_path(), destination.get_abs_path())
+        destination.invalidate()
 
     def move_object(self, destination):
-        os.rename(self.get_abs_path(), destination.get_abs_path())
+        try:
+            os.rename(self.get_abs_path(), destination.get_abs_path())
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # across file systems: copy, then remove the source
+            copy_file(self.get_abs_path(), destination.get_abs_path())
+            os.remove(self.get_abs_path())
+        self.invalidate()
+        destination.invalidate()
+
+    def move_collection(self, destination):
+        """Move the whole directory with a single rename. Only when that isn't
+        possible, across file systems or onto a non-empty directory, the children are
+        moved one by one."""
+        try:
+            os.rename(self.get_abs_path(), destination.get_abs_path())
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOTEMPTY, errno.EEXIST):
+                raise
+            super().move_collection(destination)
+        self.invalidate()
+        destination.invalidate()
 
 
 class DummyReadFSDavResource(BaseFSDavResource):
@@ -124,22 +506,494 @@ class DummyWriteFSDavResource(BaseFSDavResource):
     Provides a "dummy" write method for FS Dav Resources
     """
 
+    # upload into a temporary file next to the target and rename it over the target,
+    # so readers never see a partial file and a failed upload keeps the old content
+    atomic_write = DJANGODAV_FS_ATOMIC_WRITE
+    # one of "none", "file" (fsync the file) or "directory" (fsync the file and the
+    # directory entry); with group_commit concurrent uploads share directory fsyncs
+    durability = DJANGODAV_FS_DURABILITY
+    group_commit = DJANGODAV_FS_GROUP_COMMIT
+    # uploads are read in chunks of this size into a reusable buffer; upload_fadvise
+    # tells the kernel the file is written sequentially and won't be read back soon
+    upload_buffer_size = DJANGODAV_FS_UPLOAD_BUFFER_SIZE
+    upload_fadvise = DJANGODAV_FS_UPLOAD_FADVISE
+
     def write(self, request, temp_file=None, range_start=None):
         if temp_file:
             # move temp file (e.g., coming from nginx)
             shutil.move(temp_file, self.get_abs_path())
+            if self.durability != DURABILITY_NONE:
+                with open(self.get_abs_path(), "rb") as dst:
+                    os.fsync(dst.fileno())
+        elif range_start is None and self.atomic_write:
+            self.write_atomic(request)
         elif range_start is None:
             # open binary file and write to disk
             with open(self.get_abs_path(), "wb") as dst:
-                shutil.copyfileobj(request, dst)
+                self.write_content(request, dst)
+                self.sync_file(dst)
         else:
             # open binary file and write to disk
             with open(self.get_abs_path(), "r+b") as dst:
                 dst.seek(range_start)
-                shutil.copyfileobj(request, dst)
+                self.write_content(request, dst, range_start)
+                self.sync_file(dst)
+        if self.durability == DURABILITY_DIRECTORY:
+            self.sync_directory()
+        self.invalidate()
+
+    def write_atomic(self, request):
+        """Stream the content into a temporary file in the same directory and replace
+        the target with it in one rename."""
+        path = self.get_abs_path()
+        fd, temp_path = create_temp_file(os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                self.write_content(request, dst)
+                self.sync_file(dst)
+            if self.exists:
+                os.chmod(temp_path, self.stat.st_mode & 0o7777)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def write_content(self, request, dst, offset=0, digest=None):
+        """Write the request body to dst, preallocating Content-Length bytes and
+        updating the hashlib object digest, if given."""
+        try:
+            size = int(getattr(request, "META", {}).get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            size = 0
+        write_stream(
+            request,
+            dst,
+            size=size,
+            offset=offset,
+            buffer_size=self.upload_buffer_size,
+            fadvise=self.upload_fadvise,
+            digest=digest,
+        )
+
+    def sync_file(self, dst):
+        """Flush a written file to disk if the durability asks for it."""
+        if self.durability in (DURABILITY_FILE, DURABILITY_DIRECTORY):
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    def sync_directory(self):
+        """Flush the directory entry of the resource to disk."""
+        directory = os.path.dirname(self.get_abs_path())
+        if self.group_commit:
+            directory_sync.sync(directory)
+        else:
+            fsync_directory(directory)
 
 
 class DummyFSDAVResource(
     DummyReadFSDavResource, DummyWriteFSDavResource, BaseFSDavResource
 ):
     pass
+
+
+class ShardedFSDavResource(BaseFSDavResource):
+    """File system resource for huge flat collections. Collections stay directories,
+    but their objects are stored in hash-sharded subdirectories of a hidden
+    shard_dir, e.g. collection/.shards/3f/name, and listed from a ShardIndex.
+    Objects already stored directly in a collection directory keep working.
+    Combine it with the read and write implementations, e.g.
+    class MyResource(ShardedFSDavResource, DummyFSDAVResource)."""
+
+    shard_dir = ".shards"
+    # number of hex digits of the name hash used as shard directory (256 shards)
+    shard_width = 2
+
+    def get_plain_path(self):
+        """Return the path of the resource as a plain directory tree."""
+        return os.path.join(self.root, *self.path)
+
+    def get_shard_path(self):
+        """Return the path an object is stored at in its collection's shards."""
+        name = self.path[-1]
+        shard = md5(name.encode("utf-8")).hexdigest()[: self.shard_width]
+        return os.path.join(self.root, *self.path[:-1], self.shard_dir, shard, name)
+
+    def is_hidden(self, name):
+        return name == self.shard_dir or super().is_hidden(name)
+
+    def get_index(self):
+        """Return the ShardIndex of the collection containing this resource."""
+        return ShardIndex(os.path.join(self.root, *self.path[:-1], self.shard_dir))
+
+    @cached_property
+    def location(self):
+        """The (path, stat result) of the resource. Missing resources are located at
+        their shard path, where a PUT creates them."""
+        if self.is_root:
+            candidates = [self.get_plain_path()]
+        elif self.in_trash or self.shard_dir in self.path:
+            return self.get_plain_path(), None
+        elif self.entry is not None:
+            candidates = [self.get_plain_path()]
+        else:
+            candidates = [self.get_shard_path(), self.get_plain_path()]
+        for path in candidates:
+            try:
+                if self.entry is not None:
+                    return path, self.entry.stat()
+                return path, os.stat(path)
+            except (OSError, ValueError):
+                continue
+        return candidates[0], None
+
+    def get_abs_path(self):
+        return self.location[0]
+
+    @cached_property
+    def stat(self):
+        return self.location[1]
+
+    def invalidate(self):
+        super().invalidate()
+        self.__dict__.pop("location", None)
+
+    def get_children(self, start_after=None, limit=None):
+        """Return an iterator of the children: the subdirectories of the collection
+        and the objects found in its shard index."""
+        if not self.is_collection:
+            return
+        index = ShardIndex(os.path.join(self.get_abs_path(), self.shard_dir))
+        if start_after is None and limit is None:
+            listed = set()
+            with os.scandir(self.get_abs_path()) as it:
+                for entry in it:
+                    if not self.is_hidden(entry.name):
+                        listed.add(entry.name)
+                        yield self.get_child(entry.name, entry)
+            for name in index.names():
+                if name not in listed:
+                    yield self.get_child(name)
+            return
+        with os.scandir(self.get_abs_path()) as it:
+            entries = {
+                entry.name: entry for entry in it if not self.is_hidden(entry.name)
+            }
+        names = list(entries)
+        names.extend(name for name in index.names() if name not in entries)
+        for name in paginate_names(names, start_after, limit):
+            yield self.get_child(name, entries.get(name))
+
+    def create_collection(self):
+        os.mkdir(self.get_plain_path())
+        self.invalidate()
+
+    def restore_from(self, path):
+        if os.path.isdir(path):
+            os.rename(path, self.get_plain_path())
+            self.invalidate()
+            return
+        self.make_shard()
+        super().restore_from(path)
+        self.get_index().add(self.path[-1])
+
+    def make_shard(self):
+        """Create the shard directory a new object is stored in."""
+        os.makedirs(os.path.dirname(self.get_abs_path()), exist_ok=True)
+
+    def write(self, request, temp_file=None, range_start=None):
+        created = not self.exists
+        if created:
+            self.make_shard()
+        super().write(request, temp_file, range_start)
+        if created:
+            self.get_index().add(self.path[-1])
+
+    def delete(self):
+        sharded = self.is_object and self.get_abs_path() == self.get_shard_path()
+        errors = super().delete()
+        if sharded:
+            self.get_index().remove(self.path[-1])
+        return errors
+
+    def copy_object(self, destination, depth=0):
+        created = not destination.exists
+        if created:
+            destination.make_shard()
+        super().copy_object(destination, depth)
+        if created:
+            destination.get_index().add(destination.path[-1])
+
+    def move_object(self, destination):
+        sharded = self.get_abs_path() == self.get_shard_path()
+        created = not destination.exists
+        if created:
+            destination.make_shard()
+        super().move_object(destination)
+        if sharded:
+            self.get_index().remove(self.path[-1])
+        if created:
+            destination.get_index().add(destination.path[-1])
+
+
+@lru_cache(maxsize=None)
+def get_hash_ring(roots, replicas):
+    return HashRing(roots, replicas)
+
+
+class StripedFSDavResource(BaseFSDavResource):
+    """File system resource spreading its objects over several roots, e.g. one per
+    disk. Every object is placed on a root by consistent hashing of its path, while
+    collections exist as directories on every root; listings merge the roots into
+    one namespace. Objects are still found after they were moved or roots were
+    added, by looking at the other roots. The trash isn't supported."""
+
+    roots = []
+    # virtual points per root on the hash ring
+    ring_replicas = 100
+    use_trash = False
+
+    def get_root_paths(self):
+        """Return the path of the resource on every root."""
+        return [os.path.join(root, *self.path) for root in self.roots]
+
+    def get_placement_root(self):
+        """Return the root an object with this path is placed on."""
+        ring = get_hash_ring(tuple(self.roots), self.ring_replicas)
+        return ring.get_node("/".join(self.path))
+
+    @cached_property
+    def location(self):
+        """The (path, stat result) of the resource. Missing resources are located on
+        their placement root, where a PUT creates them."""
+        if self.entry is not None:
+            try:
+                return self.entry.path, self.entry.stat()
+            except OSError:
+                return self.entry.path, None
+        placement = os.path.join(self.get_placement_root(), *self.path)
+        candidates = [placement] + [p for p in self.get_root_paths() if p != placement]
+        for path in candidates:
+            try:
+                return path, os.stat(path)
+            except (OSError, ValueError):
+                continue
+        return placement, None
+
+    def get_abs_path(self):
+        return self.location[0]
+
+    @cached_property
+    def stat(self):
+        return self.location[1]
+
+    def invalidate(self):
+        super().invalidate()
+        self.__dict__.pop("location", None)
+
+    def get_children(self, start_after=None, limit=None):
+        """Return an iterator of the children found on any of the roots."""
+        if not self.is_collection:
+            return
+        paginate = start_after is not None or limit is not None
+        listed = {}
+        for path in self.get_root_paths():
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if self.is_hidden(entry.name) or entry.name in listed:
+                            continue
+                        if paginate:
+                            listed[entry.name] = entry
+                        else:
+                            # only the names are kept, to skip them on later roots
+                            listed[entry.name] = None
+                            yield self.get_child(entry.name, entry)
+            except FileNotFoundError:
+                continue
+        if paginate:
+            for name in paginate_names(listed, start_after, limit):
+                yield self.get_child(name, listed[name])
+
+    def create_collection(self):
+        """Create the directory on every root."""
+        first, *others = self.get_root_paths()
+        os.mkdir(first)
+        for path in others:
+            os.makedirs(path, exist_ok=True)
+        self.invalidate()
+
+    def delete(self):
+        if not self.is_collection:
+            return super().delete()
+        errors = []
+        if DIR_FD_SUPPORTED:
+            for path in self.get_root_paths():
+                if os.path.isdir(path):
+                    errors.extend(self.delete_tree(path=path))
+        else:
+            for child in self.get_children():
+                child.delete()
+            for path in self.get_root_paths():
+                if os.path.isdir(path):
+                    os.rmdir(path)
+        self.invalidate()
+        return errors or None
+
+    def move_collection(self, destination):
+        """Rename the directory on every root."""
+        try:
+            for path, target in zip(
+                self.get_root_paths(), destination.get_root_paths()
+            ):
+                if os.path.isdir(path):
+                    os.rename(path, target)
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+            BaseDavResource.move_collection(self, destination)
+        self.invalidate()
+        destination.invalidate()
+
+
+class DedupFSDavResource(DummyWriteFSDavResource):
+    """File system resource storing every distinct content only once. Uploads are
+    hashed while they stream into the hidden blob_dir store below the root, e.g.
+    .blobs/3f/3fa1..., and the name of the resource becomes a hard link to that blob.
+    Identical uploads share one blob and COPY only adds another link, so the link
+    count of a blob is its reference count. Names are never written in place, every
+    PUT links the name to a new blob instead; names sharing a blob share its
+    timestamps too. Blobs whose names are all gone are removed by collect_blobs().
+    Combine it with a read implementation, e.g.
+    class MyResource(DedupFSDavResource, DummyFSDAVResource)."""
+
+    blob_dir = ".blobs"
+    # hashlib algorithm naming the blobs
+    blob_hash = "sha256"
+
+    @property
+    def in_blobs(self):
+        """Return True if the path points into the blob store, which clients can't
+        see."""
+        return self.path[:1] == [self.blob_dir]
+
+    @cached_property
+    def stat(self):
+        if self.in_blobs:
+            return None
+        return super().stat
+
+    def is_hidden(self, name):
+        return (self.is_root and name == self.blob_dir) or super().is_hidden(name)
+
+    def get_blob_root(self):
+        return os.path.join(self.root, self.blob_dir)
+
+    def get_blob_path(self, digest):
+        """Return the path of the blob with the given hex digest."""
+        return os.path.join(self.get_blob_root(), digest[:2], digest)
+
+    def write(self, request, temp_file=None, range_start=None):
+        """Write the content into a temporary file of the blob store, hashing it on
+        the way, and link the name to the blob with that hash."""
+        blob_root = self.get_blob_root()
+        os.makedirs(blob_root, exist_ok=True)
+        fd, temp_path = create_temp_file(blob_root)
+        try:
+            if temp_file:
+                os.close(fd)
+                shutil.move(temp_file, temp_path)
+                with open(temp_path, "rb") as f:
+                    digest = file_digest(f, self.blob_hash)
+            elif range_start is None:
+                digest = new_hash(self.blob_hash)
+                with os.fdopen(fd, "wb") as dst:
+                    self.write_content(request, dst, digest=digest)
+                    self.sync_file(dst)
+            else:
+                # the blob of the name is shared, so patch a copy of it
+                os.close(fd)
+                if self.exists:
+                    copy_file(self.get_abs_path(), temp_path)
+                with open(temp_path, "r+b") as dst:
+                    dst.seek(range_start)
+                    self.write_content(request, dst, range_start)
+                    self.sync_file(dst)
+                    dst.seek(0)
+                    digest = file_digest(dst, self.blob_hash)
+            blob_path = self.store_blob(temp_path, digest.hexdigest())
+            self.link_blob(blob_path, temp_path)
+        finally:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        if self.durability == DURABILITY_DIRECTORY:
+            self.sync_directory()
+        self.invalidate()
+
+    def store_blob(self, temp_path, digest):
+        """Add the file temp_path to the store as the blob named digest, unless the
+        store already holds that content. Returns the path of the blob."""
+        blob_path = self.get_blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(temp_path, blob_path)
+        except FileExistsError:
+            pass
+        return blob_path
+
+    def link_blob(self, blob_path, temp_path):
+        """Replace the name with a hard link to the blob. Should collect_blobs have
+        removed the blob in the meantime, the name links to temp_path instead."""
+        try:
+            self.replace_with_link(blob_path, self.get_abs_path())
+        except FileNotFoundError:
+            self.replace_with_link(temp_path, self.get_abs_path())
+
+    @staticmethod
+    def replace_with_link(src, path):
+        """Atomically make path a hard link to src, replacing whatever was there."""
+        link_path = os.path.join(
+            os.path.dirname(path), "%s%s.tmp" % (TEMP_PREFIX, uuid4().hex)
+        )
+        os.link(src, link_path)
+        try:
+            os.replace(link_path, path)
+        except BaseException:
+            os.remove(link_path)
+            raise
+
+    def copy_object(self, destination, depth=0):
+        """Copy by linking the destination to the same blob. Falls back to copying
+        the content where no more links can be made."""
+        try:
+            self.replace_with_link(self.get_abs_path(), destination.get_abs_path())
+        except OSError as e:
+            if e.errno not in (errno.EMLINK, errno.EXDEV, errno.EPERM):
+                raise
+            super().copy_object(destination)
+        destination.invalidate()
+
+    @classmethod
+    def collect_blobs(cls):
+        """Remove the blobs no name links to anymore. Returns the number of blobs
+        removed."""
+        removed = 0
+        blob_root = os.path.join(cls.root, cls.blob_dir)
+        try:
+            shards = [e for e in os.scandir(blob_root) if e.is_dir()]
+        except FileNotFoundError:
+            return removed
+        for shard in shards:
+            with os.scandir(shard.path) as it:
+                for entry in it:
+                    try:
+                        if entry.stat().st_nlink == 1:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
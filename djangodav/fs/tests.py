@@ -24,10 +24,36 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+from hashlib import md5, sha256
+from io import BytesIO
+from stat import S_IFDIR, S_IFREG
+
 from django.test import TestCase
-from mock import patch
+from lxml import etree
+from mock import Mock, patch
 
-from djangodav.fs.resources import BaseFSDavResource
+from djangodav.fs.resources import (
+    BaseFSDavResource,
+    DedupFSDavResource,
+    DummyFSDAVResource,
+    DummyWriteFSDavResource,
+    ShardedFSDavResource,
+    StripedFSDavResource,
+)
+from djangodav.fs.utils import (
+    DirectorySync,
+    HashRing,
+    ShardIndex,
+    copy_file,
+    write_stream,
+)
+from djangodav.views.views import DavView
 
 
 class TestFSDavResource(TestCase):
@@ -38,39 +64,606 @@ class TestFSDavResource(TestCase):
     def setUp(self):
         self.resource = self.FSDavResource("/path/to/name")
 
-    @patch("djangodav.fs.resources.os.path.isdir")
-    def test_is_collection(self, isdir):
-        isdir.return_value = True
+    @patch("djangodav.fs.resources.os.stat")
+    def test_is_collection(self, stat):
+        stat.return_value = os.stat_result((S_IFDIR, 0, 0, 0, 0, 0, 0, 0, 0, 0))
         self.assertTrue(self.resource.is_collection)
-        isdir.assert_called_with("/some/folder/path/to/name")
+        self.assertFalse(self.resource.is_object)
+        stat.assert_called_with("/some/folder/path/to/name")
 
-    @patch("djangodav.fs.resources.os.path.isfile")
-    def test_isfile(self, isfile):
-        isfile.return_value = True
+    @patch("djangodav.fs.resources.os.stat")
+    def test_isfile(self, stat):
+        stat.return_value = os.stat_result((S_IFREG, 0, 0, 0, 0, 0, 0, 0, 0, 0))
         self.assertTrue(self.resource.is_object)
-        isfile.assert_called_with("/some/folder/path/to/name")
+        self.assertFalse(self.resource.is_collection)
+        stat.assert_called_with("/some/folder/path/to/name")
 
-    @patch("djangodav.fs.resources.os.path.exists")
-    def test_exists(self, exists):
-        exists.return_value = True
+    @patch("djangodav.fs.resources.os.stat")
+    def test_exists(self, stat):
+        stat.return_value = os.stat_result((S_IFREG, 0, 0, 0, 0, 0, 0, 0, 0, 0))
         self.assertTrue(self.resource.exists)
-        exists.assert_called_with("/some/folder/path/to/name")
+        stat.assert_called_with("/some/folder/path/to/name")
+
+    @patch("djangodav.fs.resources.os.stat")
+    def test_missing(self, stat):
+        stat.side_effect = FileNotFoundError
+        self.assertFalse(self.resource.exists)
+        self.assertFalse(self.resource.is_collection)
+        self.assertFalse(self.resource.is_object)
 
-    @patch("djangodav.fs.resources.os.path.getsize")
-    def test_get_size(self, getsize):
-        getsize.return_value = 42
+    @patch("djangodav.fs.resources.os.stat")
+    def test_get_size(self, stat):
+        stat.return_value = os.stat_result((S_IFREG, 0, 0, 0, 0, 0, 42, 0, 0, 0))
         self.assertEqual(self.resource.getcontentlength, 42)
-        getsize.assert_called_with("/some/folder/path/to/name")
+        stat.assert_called_with("/some/folder/path/to/name")
+
+    @patch("djangodav.fs.resources.os.stat")
+    def test_stat_cached(self, stat):
+        stat.return_value = os.stat_result((S_IFREG, 0, 0, 0, 0, 0, 42, 0, 0, 0))
+        self.resource.exists
+        self.resource.is_collection
+        self.resource.getcontentlength
+        self.resource.get_modified()
+        self.assertEqual(stat.call_count, 1)
+        self.resource.invalidate()
+        self.resource.exists
+        self.assertEqual(stat.call_count, 2)
 
     def test_get_abs_path(self):
         self.assertEqual(self.resource.get_abs_path(), "/some/folder/path/to/name")
 
-    @patch("djangodav.fs.resources.os.listdir")
-    @patch("djangodav.fs.resources.os.path.isdir")
-    def test_get_children(self, isdir, listdir):
-        listdir.return_value = ["child1", "child2"]
-        isdir.return_value = True
+    def mock_entries(self, scandir, *names):
+        entries = []
+        for name in names:
+            entry = Mock(is_dir=Mock(return_value=name.endswith("dir")))
+            entry.name = name
+            entries.append(entry)
+        scandir.return_value.__enter__.return_value = entries
+        return entries
+
+    @patch("djangodav.fs.resources.os.scandir")
+    @patch("djangodav.fs.resources.os.stat")
+    def test_get_children(self, stat, scandir):
+        entries = self.mock_entries(scandir, "child1", "child2")
+        stat.return_value = os.stat_result((S_IFDIR, 0, 0, 0, 0, 0, 0, 0, 0, 0))
         children = list(self.resource.get_children())
         self.assertEqual(children[0].path, ["path", "to", "name", "child1"])
         self.assertEqual(children[1].path, ["path", "to", "name", "child2"])
-        listdir.assert_called_with("/some/folder/path/to/name")
+        self.assertEqual(children[0].entry, entries[0])
+        scandir.assert_called_with("/some/folder/path/to/name")
+
+    @patch("djangodav.fs.resources.os.scandir")
+    @patch("djangodav.fs.resources.os.stat")
+    def test_get_children_page(self, stat, scandir):
+        self.mock_entries(scandir, "child3", "child1", "child4", "child2")
+        stat.return_value = os.stat_result((S_IFDIR, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        children = list(self.resource.get_children(start_after="child1", limit=2))
+        self.assertEqual(
+            [child.displayname for child in children], ["child2", "child3"]
+        )
+
+    @patch("djangodav.fs.resources.os.scandir")
+    @patch("djangodav.fs.resources.os.stat")
+    def test_get_children_streamed(self, stat, scandir):
+        def entries():
+            entry = Mock(is_dir=Mock(return_value=False))
+            entry.name = "child1"
+            yield entry
+            raise AssertionError("directory read ahead")
+
+        scandir.return_value.__enter__.return_value = entries()
+        stat.return_value = os.stat_result((S_IFDIR, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        children = self.resource.get_children()
+        self.assertEqual(next(children).displayname, "child1")
+
+    @patch("djangodav.fs.resources.os.scandir")
+    @patch("djangodav.fs.resources.os.stat")
+    def test_get_children_entry_type(self, stat, scandir):
+        self.mock_entries(scandir, "subdir", "file")
+        stat.return_value = os.stat_result((S_IFDIR, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        subdir, file = self.resource.get_children()
+        self.assertTrue(subdir.exists)
+        self.assertTrue(subdir.is_collection)
+        self.assertEqual(subdir.get_escaped_path(), "/path/to/name/subdir/")
+        self.assertFalse(file.is_collection)
+        self.assertEqual(stat.call_count, 1)  # only the parent was stat'ed
+        file.entry.stat.return_value = os.stat_result(
+            (S_IFREG, 0, 0, 0, 0, 0, 42, 0, 0, 0)
+        )
+        self.assertEqual(file.getcontentlength, 42)
+        self.assertEqual(stat.call_count, 1)
+
+    @patch("djangodav.fs.resources.os.stat")
+    def test_prefetch_stats(self, stat):
+        def fake_stat(path):
+            if path.endswith("gone"):
+                raise FileNotFoundError(path)
+            return os.stat_result((S_IFREG, 0, 0, 0, 0, 0, 42, 0, 0, 0))
+
+        stat.side_effect = fake_stat
+        resources = [
+            self.FSDavResource("/path/to/%s" % name) for name in ("a", "gone", "b")
+        ]
+        with patch.object(self.FSDavResource, "stat_workers", 2):
+            props = self.FSDavResource.bulk_properties(resources, ["getcontentlength"])
+        self.assertEqual(stat.call_count, 3)
+        self.assertEqual(
+            props, [[("getcontentlength", "42")], [], [("getcontentlength", "42")]]
+        )
+        self.assertFalse(resources[1].exists)
+        self.assertEqual(stat.call_count, 3)
+
+    @patch("djangodav.fs.resources.os.rename")
+    def test_move_collection(self, rename):
+        destination = self.FSDavResource("/path/to/other/")
+        self.resource.move_collection(destination)
+        rename.assert_called_once_with(
+            "/some/folder/path/to/name", "/some/folder/path/to/other"
+        )
+
+    def test_move_collection_cross_device(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "src", "sub"))
+            with open(os.path.join(root, "src", "sub", "file"), "w") as f:
+                f.write("content")
+            os.mkdir(os.path.join(root, "dst"))
+
+            resource = type("Resource", (BaseFSDavResource,), {"root": root})("/src/")
+            destination = resource.clone("/dst/")
+            with patch(
+                "djangodav.fs.resources.os.rename",
+                side_effect=OSError(errno.EXDEV, "Invalid cross-device link"),
+            ):
+                resource.move_collection(destination)
+
+            self.assertFalse(os.path.exists(os.path.join(root, "src")))
+            with open(os.path.join(root, "dst", "sub", "file")) as f:
+                self.assertEqual(f.read(), "content")
+
+
+class TempRootTestCase(TestCase):
+    """Base for tests running resources on a temporary root directory."""
+
+    resource_bases = (BaseFSDavResource,)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.resource_class = self.make_resource_class(root=self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_resource_class(self, **attrs):
+        return type("Resource", self.resource_bases, attrs)
+
+    def put(self, path, content=b"content", **kwargs):
+        """PUT the content to path through the resource class."""
+        resource = self.resource_class(path)
+        resource.write(BytesIO(content), **kwargs)
+        return resource
+
+    def read(self, path):
+        with self.resource_class(path).read() as f:
+            return f.read()
+
+    def listing(self, path):
+        return sorted(c.displayname for c in self.resource_class(path).get_children())
+
+    def make_files(self, *names):
+        """Create the files below the root, each containing its name."""
+        for name in names:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(name)
+
+
+class TestFSTree(TempRootTestCase):
+    def test_copy_collection_errors(self):
+        self.make_files("src/a", "src/bad", "src/sub/b", "src/sub/deeper/c")
+        os.mkdir(os.path.join(self.root, "dst"))
+
+        def fake_copy_file(src, dst):
+            if src.endswith("bad"):
+                raise PermissionError(src)
+            copy_file(src, dst)
+
+        resource = self.resource_class("/src/")
+        with patch("djangodav.fs.resources.copy_file", side_effect=fake_copy_file):
+            errors = resource.copy(resource.clone("/dst/"))
+
+        self.assertEqual(
+            [(r.get_path(), status) for r, status in errors],
+            [("/src/bad", "HTTP/1.1 403 Forbidden")],
+        )
+        for name in ("a", "sub/b", "sub/deeper/c"):
+            with open(os.path.join(self.root, "dst", name)) as f:
+                self.assertEqual(f.read(), "src/" + name)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "dst", "bad")))
+
+    def test_delete_tree(self):
+        self.make_files("tree/a", "tree/sub/b", "tree/sub/deeper/bad", "tree/other/c")
+        unlink = os.unlink
+
+        def fake_unlink(name, dir_fd=None):
+            if name == "bad":
+                raise PermissionError(name)
+            unlink(name, dir_fd=dir_fd)
+
+        with patch("djangodav.fs.resources.os.unlink", side_effect=fake_unlink):
+            errors = self.resource_class("/tree/").delete()
+
+        self.assertEqual(
+            [(r.path, status) for r, status in errors],
+            [(["tree", "sub", "deeper", "bad"], "HTTP/1.1 403 Forbidden")],
+        )
+        remaining = [
+            os.path.relpath(os.path.join(dirpath, name), self.root)
+            for dirpath, dirnames, filenames in os.walk(self.root)
+            for name in dirnames + filenames
+        ]
+        self.assertEqual(
+            sorted(remaining),
+            ["tree", "tree/sub", "tree/sub/deeper", "tree/sub/deeper/bad"],
+        )
+
+    def test_propfind_vanished(self):
+        self.make_files("dir/a", "dir/gone", "dir/subdir/b")
+        resource = self.resource_class("/dir/")
+        children = list(resource.get_descendants(depth=1))
+        os.remove(os.path.join(self.root, "dir", "gone"))
+        shutil.rmtree(os.path.join(self.root, "dir", "subdir"))
+
+        v = DavView(base_url="/dav", request=Mock(META={}))
+        v.__dict__["resource"] = resource
+        response = v.build_propfind_response(children)
+        hrefs = [r.findtext("{DAV:}href") for r in etree.fromstring(response.content)]
+        self.assertEqual(hrefs, ["/dav/dir/", "/dav/dir/a"])
+
+
+class TestFSTrash(TempRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.resource_class = self.make_resource_class(root=self.root, use_trash=True)
+
+    def test_trash(self):
+        self.make_files("dir/sub/file")
+
+        self.assertIsNone(self.resource_class("/dir/").delete())
+        self.assertEqual(os.listdir(self.root), [".trash"])
+        self.assertEqual(list(self.resource_class("/").get_children()), [])
+        self.assertFalse(self.resource_class("/.trash/").exists)
+        [(trash_id, path, deleted)] = self.resource_class.list_trash()
+        self.assertEqual(path, "/dir/")
+
+        self.resource_class.restore_trash(trash_id)
+        with open(os.path.join(self.root, "dir", "sub", "file")) as f:
+            self.assertEqual(f.read(), "dir/sub/file")
+        self.assertEqual(self.resource_class.list_trash(), [])
+
+        self.resource_class("/dir/sub/file").delete()
+        self.assertEqual(self.resource_class.purge_trash(older_than=60), [])
+        [(trash_id, path, deleted)] = self.resource_class.list_trash()
+        self.assertEqual(self.resource_class.purge_trash(), [trash_id])
+        self.assertEqual(os.listdir(os.path.join(self.root, ".trash")), [])
+        self.assertEqual(os.listdir(os.path.join(self.root, "dir", "sub")), [])
+
+    def test_trash_listing_page(self):
+        os.mkdir(os.path.join(self.root, ".trash"))
+        self.make_files("a", "b", "c", "d")
+        root = self.resource_class("/")
+        self.assertEqual(
+            [c.displayname for c in root.get_children(limit=3)], ["a", "b", "c"]
+        )
+        self.assertEqual(
+            [c.displayname for c in root.get_children(start_after="c", limit=3)],
+            ["d"],
+        )
+
+
+class TestCopyFile(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "src")
+        self.dst = os.path.join(self.tmp.name, "dst")
+        with open(self.src, "wb") as f:
+            f.write(os.urandom(3 * 1024 + 5))
+        os.utime(self.src, (1000000000, 1000000000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assertCopied(self):
+        with open(self.src, "rb") as src, open(self.dst, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertEqual(os.stat(self.dst).st_mtime, 1000000000)
+
+    def test_copy_file(self):
+        copy_file(self.src, self.dst)
+        self.assertCopied()
+
+    @patch("djangodav.fs.utils.reflink", return_value=False)
+    @patch("djangodav.fs.utils.os.copy_file_range", create=True)
+    def test_copy_file_sendfile(self, copy_file_range, reflink):
+        copy_file_range.side_effect = OSError(errno.EXDEV, "cross-device")
+        copy_file(self.src, self.dst, chunk_size=1024)
+        self.assertCopied()
+
+    @patch("djangodav.fs.utils.reflink", return_value=False)
+    @patch("djangodav.fs.utils.os.sendfile", create=True)
+    @patch("djangodav.fs.utils.os.copy_file_range", create=True)
+    def test_copy_file_buffered(self, copy_file_range, sendfile, reflink):
+        copy_file_range.side_effect = OSError(errno.ENOSYS, "not implemented")
+        sendfile.side_effect = OSError(errno.EINVAL, "invalid")
+        copy_file(self.src, self.dst, chunk_size=1024)
+        self.assertCopied()
+
+
+class TestAtomicWrite(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.resource_class = type(
+            "Resource",
+            (DummyWriteFSDavResource,),
+            {"root": self.tmp.name, "atomic_write": True},
+        )
+        self.path = os.path.join(self.tmp.name, "file")
+        with open(self.path, "wb") as f:
+            f.write(b"old")
+        os.chmod(self.path, 0o640)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_atomic(self):
+        resource = self.resource_class("/file")
+        with patch("djangodav.fs.resources.os.fsync") as fsync, patch(
+            "djangodav.fs.resources.fsync_directory"
+        ) as sync_dir:
+            resource.durability = "directory"
+            resource.write(BytesIO(b"new content"))
+        self.assertEqual(fsync.call_count, 1)
+        sync_dir.assert_called_once_with(self.tmp.name)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"new content")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.tmp.name), ["file"])
+
+    def test_write_atomic_new(self):
+        umask = os.umask(0o027)
+        try:
+            self.resource_class("/new").write(BytesIO(b"new"))
+        finally:
+            os.umask(umask)
+        path = os.path.join(self.tmp.name, "new")
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+    def test_write_atomic_hidden(self):
+        def read(size):
+            self.assertEqual(
+                [c.displayname for c in self.resource_class("/").get_children()],
+                ["file"],
+            )
+            return b""
+
+        self.resource_class("/file").write(Mock(spec=["read"], read=read))
+        self.assertEqual(os.listdir(self.tmp.name), ["file"])
+
+    def test_write_atomic_failed(self):
+        request = Mock(
+            spec=["read"], read=Mock(side_effect=[b"partial", IOError("disconnected")])
+        )
+        with self.assertRaises(IOError):
+            self.resource_class("/file").write(request)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(self.tmp.name), ["file"])
+
+    def test_group_commit(self):
+        syncs = []
+
+        def slow_fsync_directory(path):
+            syncs.append(path)
+            time.sleep(0.05)
+
+        directory_sync = DirectorySync()
+        with patch(
+            "djangodav.fs.utils.fsync_directory", side_effect=slow_fsync_directory
+        ):
+            threads = [
+                threading.Thread(target=directory_sync.sync, args=(self.tmp.name,))
+                for i in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLess(len(syncs), 8)
+        self.assertGreaterEqual(len(syncs), 1)
+        self.assertEqual(directory_sync.directories, {})
+
+
+class TestWriteStream(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_stream(self):
+        content = os.urandom(10 * 1024 + 3)
+        with open(self.path, "wb") as dst:
+            written = write_stream(
+                BytesIO(content), dst, size=len(content), buffer_size=1024, fadvise=True
+            )
+        self.assertEqual(written, len(content))
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_write_stream_read(self):
+        src = Mock(spec=["read"], read=Mock(side_effect=[b"abc", b"def", b""]))
+        with open(self.path, "wb") as dst:
+            self.assertEqual(write_stream(src, dst, buffer_size=3), 6)
+        src.read.assert_called_with(3)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    def test_write_stream_short(self):
+        with open(self.path, "wb") as dst:
+            write_stream(BytesIO(b"short"), dst, size=1000)
+        self.assertEqual(os.path.getsize(self.path), 5)
+
+    def test_write_content_length(self):
+        resource_class = type(
+            "Resource", (DummyWriteFSDavResource,), {"root": self.tmp.name}
+        )
+        request = Mock(META={"CONTENT_LENGTH": "5"}, read=BytesIO(b"hello").read)
+        with patch("djangodav.fs.resources.write_stream") as write:
+            resource_class("/file").write(request)
+        self.assertEqual(write.call_args[1]["size"], 5)
+
+
+class TestShardedFSDavResource(TempRootTestCase):
+    resource_bases = (ShardedFSDavResource, DummyFSDAVResource)
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir(os.path.join(self.root, "flat"))
+
+    def test_write(self):
+        resource = self.put("/flat/name")
+        self.assertTrue(resource.is_object)
+        self.assertEqual(
+            resource.get_abs_path(),
+            os.path.join(
+                self.root, "flat", ".shards", md5(b"name").hexdigest()[:2], "name"
+            ),
+        )
+        self.assertEqual(os.listdir(os.path.join(self.root, "flat")), [".shards"])
+        self.assertEqual(self.listing("/flat/"), ["name"])
+        self.assertFalse(self.resource_class("/flat/.shards/").exists)
+
+    def test_listing(self):
+        for i in range(20):
+            self.put("/flat/file%d" % i)
+        self.resource_class("/flat/sub/").create_collection()
+        self.resource_class("/flat/file3").delete()
+        self.assertEqual(
+            self.listing("/flat/"),
+            sorted(["file%d" % i for i in range(20) if i != 3] + ["sub"]),
+        )
+        sub = self.resource_class("/flat/sub/")
+        self.assertTrue(sub.is_collection)
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "flat", "sub")))
+
+    def test_copy_move(self):
+        source = self.put("/flat/a", b"data")
+        self.resource_class("/other/").create_collection()
+        source.copy(self.resource_class("/other/b"))
+        self.resource_class("/other/b").move(self.resource_class("/flat/c"))
+        self.assertEqual(self.listing("/flat/"), ["a", "c"])
+        self.assertEqual(self.listing("/other/"), [])
+        self.assertEqual(self.read("/flat/c"), b"data")
+
+    def test_index_compaction(self):
+        index = ShardIndex(os.path.join(self.root, "index"))
+        index.compact_min_lines = 4
+        for name in ("a", "b\nc", "d"):
+            index.add(name)
+        index.remove("a")
+        index.remove("d")
+        self.assertEqual(index.names(), ["b\nc"])
+        with open(index.path) as f:
+            self.assertEqual(f.read(), "+b%0Ac\n")
+
+
+class TestStripedFSDavResource(TempRootTestCase):
+    resource_bases = (StripedFSDavResource, DummyFSDAVResource)
+
+    def setUp(self):
+        super().setUp()
+        self.roots = [os.path.join(self.root, "disk%d" % i) for i in range(2)]
+        for root in self.roots:
+            os.mkdir(root)
+        self.resource_class = self.make_resource_class(roots=self.roots)
+
+    def test_hash_ring(self):
+        ring = HashRing(["a", "b", "c"])
+        keys = ["key%d" % i for i in range(300)]
+        placed = {key: ring.get_node(key) for key in keys}
+        self.assertEqual(set(placed.values()), {"a", "b", "c"})
+        grown = HashRing(["a", "b", "c", "d"])
+        moved = [key for key in keys if grown.get_node(key) != placed[key]]
+        self.assertTrue(all(grown.get_node(key) == "d" for key in moved))
+        self.assertLess(len(moved), 150)
+
+    def test_striping(self):
+        self.resource_class("/dir/").create_collection()
+        for root in self.roots:
+            self.assertTrue(os.path.isdir(os.path.join(root, "dir")))
+        for i in range(20):
+            self.put("/dir/file%d" % i)
+        for root in self.roots:
+            self.assertTrue(os.listdir(os.path.join(root, "dir")))
+        self.assertEqual(self.listing("/dir/"), sorted("file%d" % i for i in range(20)))
+        self.assertEqual(self.read("/dir/file7"), b"content")
+
+    def test_move_delete(self):
+        self.resource_class("/dir/").create_collection()
+        for i in range(10):
+            self.put("/dir/file%d" % i)
+        self.resource_class("/dir/").move(self.resource_class("/moved/"))
+        self.assertFalse(self.resource_class("/dir/").exists)
+        self.assertEqual(
+            self.listing("/moved/"), sorted("file%d" % i for i in range(10))
+        )
+        for i in range(10):
+            self.assertTrue(self.resource_class("/moved/file%d" % i).is_object)
+        self.resource_class("/moved/").delete()
+        for root in self.roots:
+            self.assertEqual(os.listdir(root), [])
+
+
+class TestDedupFSDavResource(TempRootTestCase):
+    resource_bases = (DedupFSDavResource, DummyFSDAVResource)
+
+    def test_write(self):
+        a = self.put("/a", b"data")
+        b = self.put("/b", b"data")
+        blob = os.path.join(self.root, ".blobs", sha256(b"data").hexdigest()[:2])
+        self.assertEqual(len(os.listdir(blob)), 1)
+        self.assertEqual(a.stat.st_ino, b.stat.st_ino)
+        self.assertEqual(a.stat.st_nlink, 3)
+        self.assertEqual(self.listing("/"), ["a", "b"])
+        self.assertFalse(self.resource_class("/.blobs/").exists)
+
+    def test_overwrite(self):
+        self.put("/a", b"data")
+        self.resource_class("/a").copy(self.resource_class("/b"))
+        self.put("/b", b"other")
+        self.put("/a", b"XY", range_start=1)
+        self.assertEqual(self.read("/a"), b"dXYa")
+        self.assertEqual(self.read("/b"), b"other")
+        self.assertEqual(self.resource_class.collect_blobs(), 1)
+        self.assertEqual(self.resource_class.collect_blobs(), 0)
+
+    def test_copy(self):
+        self.put("/a", b"data")
+        self.resource_class("/dir/").create_collection()
+        self.resource_class("/a").copy(self.resource_class("/dir/b"))
+        b = self.resource_class("/dir/b")
+        self.assertEqual(b.stat.st_ino, self.resource_class("/a").stat.st_ino)
+        self.assertEqual(self.read("/dir/b"), b"data")
+        self.resource_class("/a").delete()
+        self.resource_class("/dir/").delete()
+        self.assertEqual(self.resource_class.collect_blobs(), 1)
+
+    def test_listing_page(self):
+        for name in ("a", "b", "c"):
+            self.put("/" + name)
+        self.assertEqual(
+            [c.displayname for c in self.resource_class("/").get_children(limit=2)],
+            ["a", "b"],
+        )
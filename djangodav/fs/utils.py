@@ -0,0 +1,363 @@
+# Refactoring, Django 1.11 compatibility, cleanups, bugfixes (c) 2018 Christian Kreuzberger <ckreuzberger@anexia-it.com>
+# All rights reserved.
+#
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+import os
+import shutil
+import threading
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from hashlib import md5
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# ioctl request cloning a whole file on btrfs, xfs and other reflink capable file
+# systems: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 1024 * 1024
+# errors meaning "this method doesn't work for these files", try the next one
+COPY_UNSUPPORTED_ERRORS = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.ETXTBSY,
+    errno.EXDEV,
+}
+
+# durability of writes: rely on the page cache, fsync the file, or fsync the file
+# and its directory so that the rename itself survives a crash too
+DURABILITY_NONE = "none"
+DURABILITY_FILE = "file"
+DURABILITY_DIRECTORY = "directory"
+
+
+def fsync_directory(path):
+    """Flush the directory entries of path to disk."""
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _DirectoryState:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.requested = 0
+        self.synced = 0
+        self.syncing = False
+        self.waiters = 0
+
+
+class DirectorySync:
+    """fsync directories with group commit: writers renaming into the same directory
+    at the same time share a single fsync. Every sync() returns once an fsync that
+    started after the call has completed. delay is how long the syncing thread
+    waits for more writers to join before it flushes."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.directories = {}
+
+    def sync(self, path):
+        with self.lock:
+            state = self.directories.setdefault(path, _DirectoryState())
+            state.waiters += 1
+        try:
+            self._sync(path, state)
+        finally:
+            with self.lock:
+                state.waiters -= 1
+                if not state.waiters:
+                    del self.directories[path]
+
+    def _sync(self, path, state):
+        with state.cond:
+            state.requested += 1
+            ticket = state.requested
+            while state.synced < ticket:
+                if not state.syncing:
+                    break
+                state.cond.wait()
+            else:
+                return
+            state.syncing = True
+        synced = None
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            with state.cond:
+                target = state.requested
+            fsync_directory(path)
+            synced = target
+        finally:
+            with state.cond:
+                state.syncing = False
+                if synced is not None:
+                    state.synced = max(state.synced, synced)
+                state.cond.notify_all()
+
+
+directory_sync = DirectorySync()
+
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+# errors meaning preallocation isn't supported by the file system
+FALLOCATE_UNSUPPORTED_ERRORS = {
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+}
+
+_buffers = threading.local()
+
+
+def get_buffer(size):
+    """Return a per-thread reusable buffer of size bytes."""
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) != size:
+        buffer = _buffers.buffer = memoryview(bytearray(size))
+    return buffer
+
+
+def write_stream(
+    src,
+    dst,
+    size=None,
+    offset=0,
+    buffer_size=UPLOAD_BUFFER_SIZE,
+    fadvise=False,
+    digest=None,
+):
+    """Copy the stream src into the file dst, positioned at offset. When the size is
+    known the space is preallocated in one extent first. Data is read with readinto
+    into a reusable buffer where src supports it. fadvise hints sequential access
+    and drops the written pages from the cache afterwards. The hashlib object digest,
+    if given, is updated with the data on the way. Returns the number of bytes
+    written."""
+    fd = dst.fileno()
+    original_size = os.fstat(fd).st_size
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, offset, size)
+        except OSError as e:
+            if e.errno not in FALLOCATE_UNSUPPORTED_ERRORS:
+                raise
+    if fadvise and hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    written = 0
+    readinto = getattr(src, "readinto", None)
+    if readinto is not None:
+        buffer = get_buffer(buffer_size)
+        while n := readinto(buffer):
+            dst.write(buffer[:n])
+            if digest is not None:
+                digest.update(buffer[:n])
+            written += n
+    else:
+        while chunk := src.read(buffer_size):
+            dst.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            written += len(chunk)
+    dst.flush()
+
+    if size and written < size and offset + size > original_size:
+        # the upload ended early, drop the preallocated tail
+        os.ftruncate(fd, max(original_size, offset + written))
+    if fadvise and hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, written, os.POSIX_FADV_DONTNEED)
+    return written
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes. Every node gets replicas points on the
+    ring, so keys spread evenly and adding a node moves only about 1/n of them."""
+
+    def __init__(self, nodes, replicas=100):
+        points = sorted(
+            (self.hash("%s#%d" % (node, i)), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self.points = [point for point, node in points]
+        self.nodes = [node for point, node in points]
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key):
+        return self.nodes[bisect(self.points, self.hash(key)) % len(self.points)]
+
+
+class ShardIndex:
+    """The object names of a sharded collection, kept as an append-only log of
+    "+name" and "-name" lines in directory/index. Listing the collection reads this
+    one file instead of all shard directories. The log is compacted once it has grown
+    to more than twice the number of live names."""
+
+    compact_min_lines = 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "index")
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(
+            os.path.join(self.directory, "lock"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def append(self, *lines):
+        with self.locked(), open(self.path, "a", encoding="ascii") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+    def add(self, name):
+        self.append("+" + quote(name, safe=""))
+
+    def remove(self, name):
+        self.append("-" + quote(name, safe=""))
+
+    def read(self):
+        try:
+            with open(self.path, encoding="ascii") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return [], 0
+        names = {}
+        for line in lines:
+            if line.startswith("+"):
+                names[line[1:]] = None
+            elif line.startswith("-"):
+                names.pop(line[1:], None)
+        return [unquote(name) for name in names], len(lines)
+
+    def names(self):
+        names, lines = self.read()
+        if lines > max(2 * len(names), self.compact_min_lines):
+            self.compact()
+        return names
+
+    def compact(self):
+        """Rewrite the log with one line per live name."""
+        with self.locked():
+            names, lines = self.read()
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="ascii") as f:
+                f.write("".join("+%s\n" % quote(name, safe="") for name in names))
+            os.replace(temp_path, self.path)
+
+
+def error_status(error):
+    """Return the multistatus status line for an OSError raised while working on
+    one member of a tree."""
+    if isinstance(error, PermissionError):
+        return "HTTP/1.1 403 Forbidden"
+    if isinstance(error, FileNotFoundError):
+        return "HTTP/1.1 404 Not Found"
+    if isinstance(error, FileExistsError):
+        return "HTTP/1.1 409 Conflict"
+    if error.errno in (errno.ENOSPC, errno.EDQUOT):
+        return "HTTP/1.1 507 Insufficient Storage"
+    if error.errno == errno.EBUSY:
+        return "HTTP/1.1 423 Locked"
+    return "HTTP/1.1 500 Internal Server Error"
+
+
+def reflink(fsrc, fdst):
+    """Share the data blocks of fsrc with fdst (FICLONE). Returns False where the
+    file system or platform doesn't support it."""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError as e:
+        if e.errno not in COPY_UNSUPPORTED_ERRORS:
+            raise
+        return False
+    return True
+
+
+def copy_range(fsrc, fdst, chunk_size=COPY_CHUNK_SIZE):
+    """Copy from the current position of fsrc to the end inside the kernel with
+    copy_file_range. Returns False if it isn't available, the copy then continues
+    from wherever it stopped."""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        while os.copy_file_range(fsrc.fileno(), fdst.fileno(), chunk_size):
+            pass
+    except OSError as e:
+        if e.errno not in COPY_UNSUPPORTED_ERRORS:
+            raise
+        return False
+    return True
+
+
+def send_file(fsrc, fdst, chunk_size=COPY_CHUNK_SIZE):
+    """Copy from the current position of fsrc to the end with sendfile, which
+    avoids the user space round trip but still moves the bytes."""
+    if not hasattr(os, "sendfile"):
+        return False
+    try:
+        while os.sendfile(fdst.fileno(), fsrc.fileno(), None, chunk_size):
+            pass
+    except OSError as e:
+        if e.errno not in COPY_UNSUPPORTED_ERRORS:
+            raise
+        return False
+    return True
+
+
+def copy_file(src, dst, chunk_size=COPY_CHUNK_SIZE):
+    """Copy the content and metadata (mode, times, flags, xattrs) of src to dst.
+    The cheapest method that works is used: a reflink, copy_file_range, sendfile
+    and finally a plain buffered copy."""
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        if not (
+            reflink(fsrc, fdst)
+            or copy_range(fsrc, fdst, chunk_size)
+            or send_file(fsrc, fdst, chunk_size)
+        ):
+            shutil.copyfileobj(fsrc, fdst, chunk_size)
+    shutil.copystat(src, dst)
@@ -30,6 +30,10 @@ class DummyLock(BaseLock):
     def get(self, *args, **kwargs):
         pass
 
+    @classmethod
+    def get_tree_version(cls, resource, depth):
+        return 0  # never holds a lock
+
     def acquire(self, *args, **kwargs):
         return str(uuid4())
 
@@ -0,0 +1,69 @@
+# Refactoring, Django 1.11 compatibility, cleanups, bugfixes (c) 2018 Christian Kreuzberger <ckreuzberger@anexia-it.com>
+# All rights reserved.
+#
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the trash of a file system resource class with use_trash enabled: "
+        "purge it, list its entries or restore one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "resource_class", help="Dotted path of the BaseFSDavResource subclass."
+        )
+        parser.add_argument("action", choices=["purge", "list", "restore"])
+        parser.add_argument("trash_id", nargs="?", help="Trash entry to restore.")
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=None,
+            help="Only purge entries deleted more than this many seconds ago.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Remove at most this many files and directories per second.",
+        )
+        parser.add_argument("--to", default=None, help="Restore to this path instead.")
+
+    def handle(self, resource_class, action, trash_id=None, **options):
+        resource_class = import_string(resource_class)
+        if action == "list":
+            for entry_id, path, deleted in resource_class.list_trash():
+                self.stdout.write("%s\t%s\t%s" % (entry_id, deleted.isoformat(), path))
+        elif action == "restore":
+            if not trash_id:
+                raise CommandError("Which trash entry should be restored?")
+            try:
+                resource = resource_class.restore_trash(trash_id, options["to"])
+            except OSError as e:
+                raise CommandError("Can't restore %s: %s" % (trash_id, e))
+            self.stdout.write("Restored %s" % resource.get_path())
+        else:
+            purged = resource_class.purge_trash(options["older_than"], options["rate"])
+            self.stdout.write("Purged %d trash entries" % len(purged))
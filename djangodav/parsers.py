@@ -0,0 +1,101 @@
+# Refactoring, Django 1.11 compatibility, cleanups, bugfixes (c) 2018 Christian Kreuzberger <ckreuzberger@anexia-it.com>
+# All rights reserved.
+#
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+from functools import lru_cache
+
+from lxml import etree
+
+from djangodav.utils import WEBDAV_NSMAP
+
+_local = threading.local()
+
+
+def get_parser():
+    """Return the XML parser of the current thread. lxml parsers can be reused for
+    many documents, but must not be shared between threads. Entities are never
+    resolved and no network access is allowed while parsing request bodies."""
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = etree.XMLParser(
+            ns_clean=True, resolve_entities=False, no_network=True
+        )
+    return parser
+
+
+@lru_cache(maxsize=128)
+def compile_xpath(path):
+    """Return the compiled XPath expression, using the WebDav namespace map. Compiled
+    expressions are cached, so the handlers of DavView compile each of theirs once."""
+    return etree.XPath(path, namespaces=WEBDAV_NSMAP)
+
+
+class XmlBody:
+    """A parsed XML request body. Calling it evaluates an XPath expression on the
+    document, like etree.XPathDocumentEvaluator, but reuses compiled expressions."""
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __call__(self, path):
+        return compile_xpath(path)(self.tree)
+
+
+def parse_xml(stream):
+    """Parse an XML request body with the parser of the current thread."""
+    return XmlBody(etree.parse(stream, get_parser()))
+
+
+def parse_propertyupdate(stream):
+    """Parse a PROPPATCH body incrementally. Property values are never used, so the
+    content nested in a property is dropped as soon as it is parsed and the property
+    itself once its name is recorded. The returned document only holds the
+    D:set and D:remove instructions with empty property elements, which keeps memory
+    bounded by the number of properties rather than by the size of the body."""
+    context = etree.iterparse(
+        stream, events=("start", "end"), resolve_entities=False, no_network=True
+    )
+    properties = []
+    depth = 0
+    for event, element in context:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        parent = element.getparent()
+        if depth > 3:
+            # content of a property value
+            element.clear()
+            parent.remove(element)
+        elif depth == 3 and parent.tag == "{DAV:}prop":
+            properties.append((parent.getparent().tag, element.tag))
+            parent.remove(element)
+
+    root = context.root
+    update = etree.Element(root.tag, nsmap=root.nsmap)
+    prop = None
+    for action, tag in properties:
+        if prop is None or prop.getparent().tag != action:
+            prop = etree.SubElement(etree.SubElement(update, action), "{DAV:}prop")
+        etree.SubElement(prop, tag)
+    return XmlBody(update.getroottree())
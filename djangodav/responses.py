@@ -26,7 +26,7 @@ try:
     import httplib
 except ImportError:
     from http import client as httplib
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 # When possible, code returns an HTTPResponse sub-class. In some situations, we want to be able
 # to raise an exception to control the response (error conditions within utility functions). In
@@ -51,10 +51,18 @@ class HttpResponseMediatypeNotSupported(HttpResponse):
     status_code = httplib.UNSUPPORTED_MEDIA_TYPE
 
 
+class HttpResponseRequestEntityTooLarge(HttpResponse):
+    status_code = httplib.REQUEST_ENTITY_TOO_LARGE
+
+
 class HttpResponseMultiStatus(HttpResponse):
     status_code = httplib.MULTI_STATUS
 
 
+class StreamingHttpResponseMultiStatus(StreamingHttpResponse):
+    status_code = httplib.MULTI_STATUS
+
+
 class HttpResponseNotImplemented(HttpResponse):
     status_code = httplib.NOT_IMPLEMENTED
 
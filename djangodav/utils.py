@@ -23,14 +23,21 @@
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import binascii
 import calendar
+import io
+import re
 import time
 import unicodedata
+import zlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 from email.utils import parsedate_tz
 from urllib.parse import quote as urlquote
 
 import lxml.builder as lb
 from django.utils.feedgenerator import rfc2822_date
+from lxml import etree
 
 # Sun, 06 Nov 1994 08:49:37 GMT  ; RFC 822, updated by RFC 1123
 FORMAT_RFC_822 = "%a, %d %b %Y %H:%M:%S GMT"
@@ -45,6 +52,18 @@ WEBDAV_NSMAP = {"D": WEBDAV_NS}
 
 D = lb.ElementMaker(namespace=WEBDAV_NS, nsmap=WEBDAV_NSMAP)
 
+STREAMING_CHUNK_SIZE = 64 * 1024
+
+MISSING = object()
+
+# number of formatted timestamps remembered by rfc1123_date and rfc3339_date
+DATE_MEMO_SIZE = 4096
+_rfc1123_memo = {}
+_rfc3339_memo = {}
+
+# characters lxml refuses in text content
+XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
 
 def get_property_tag_list(res, *names):
     props = []
@@ -57,15 +76,179 @@ def get_property_tag_list(res, *names):
 
 
 def get_property_tag(res, name):
+    prop = get_property(res, name)
+    if prop is None:
+        return
+    return property_element(*prop)
+
+
+def get_property_list(res, *names):
+    """Like get_property_tag_list, but returns (name, value) pairs instead of elements."""
+    props = []
+    for name in names:
+        prop = get_property(res, name)
+        if prop is None:
+            continue
+        props.append(prop)
+    return props
+
+
+def get_property(res, name):
+    """Return a property of the resource as a (name, value) pair, where value is the
+    text of the property, None for an empty element or a list of nested (name, value)
+    pairs. Returns None if the resource doesn't provide the property."""
     if name == "resourcetype":
         if res.is_collection:
-            return D(name, D.collection)
-        return D(name)
-    try:
-        if hasattr(res, name):
-            return D(name, str(getattr(res, name)))
-    except AttributeError:
+            return name, [("collection", None)]
+        return name, None
+    value = getattr(res, name, MISSING)
+    if value is MISSING:
         return
+    return name, str(value)
+
+
+def property_element(name, value=None):
+    """Build the DAV: element for a (name, value) property pair."""
+    if value is None:
+        return D(name)
+    if isinstance(value, str):
+        return D(name, value)
+    return D(name, *[property_element(*child) for child in value])
+
+
+def iter_multistatus(
+    responses, encoding="utf-8", pretty_print=False, chunk_size=STREAMING_CHUNK_SIZE
+):
+    """Incrementally serialize D:response elements into a D:multistatus document.
+    Every response is written and dropped as soon as it is produced, so memory use
+    does not grow with the number of responses. Yields chunks of roughly chunk_size bytes.
+    """
+    buf = io.BytesIO()
+    with etree.xmlfile(buf, encoding=encoding) as xf:
+        xf.write_declaration()
+        with xf.element("{%s}multistatus" % WEBDAV_NS, nsmap=WEBDAV_NSMAP):
+            for response in responses:
+                xf.write(response, pretty_print=pretty_print)
+                if buf.tell() >= chunk_size:
+                    xf.flush()
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+    yield buf.getvalue()
+
+
+def xml_escape(text):
+    """Escape text content the way lxml serializes it."""
+    if XML_INVALID_CHARS.search(text):
+        raise ValueError(
+            "All strings must be XML compatible: Unicode or ASCII, no NULL bytes or "
+            "control characters"
+        )
+    return (
+        text.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace("\r", "&#13;")
+    )
+
+
+class MultistatusSerializer:
+    """Builds D:multistatus documents from pre-encoded byte templates instead of lxml
+    elements. The output is byte-identical to serializing the equivalent element tree
+    with etree.tostring(tree, xml_declaration=True, encoding=..., pretty_print=...).
+    """
+
+    def __init__(self, encoding="utf-8", pretty_print=False):
+        self.encoding = encoding
+        self.pretty_print = pretty_print
+        self.templates = {}
+        self.declaration = ("<?xml version='1.0' encoding='%s'?>\n" % encoding).encode(
+            encoding
+        )
+        self.open = self.encode('<D:multistatus xmlns:D="%s">' % WEBDAV_NS)
+        self.close = self.encode("</D:multistatus>")
+        self.empty = self.encode('<D:multistatus xmlns:D="%s"/>' % WEBDAV_NS)
+        self.newline = b"\n" if pretty_print else b""
+
+    def encode(self, text):
+        return text.encode(self.encoding, "xmlcharrefreplace")
+
+    def get_templates(self, name, level):
+        key = (name, level)
+        try:
+            return self.templates[key]
+        except KeyError:
+            pass
+        indent = self.encode("  " * level) if self.pretty_print else b""
+        templates = self.templates[key] = (
+            indent + self.encode("<D:%s>" % name),
+            self.encode("</D:%s>" % name) + self.newline,
+            indent + self.encode("<D:%s/>" % name) + self.newline,
+            indent,
+        )
+        return templates
+
+    def write_element(self, out, name, value=None, level=0):
+        open_tag, close_tag, empty_tag, indent = self.get_templates(name, level)
+        if value is None:
+            out.append(empty_tag)
+        elif isinstance(value, str):
+            out.append(open_tag)
+            out.append(self.encode(xml_escape(value)))
+            out.append(close_tag)
+        elif not value:
+            out.append(empty_tag)
+        else:
+            out.append(open_tag + self.newline)
+            for child in value:
+                self.write_element(out, *child, level=level + 1)
+            out.append(indent + close_tag)
+
+    def response(self, href, props, status="HTTP/1.1 200 OK"):
+        """Serialize a D:response with a single D:propstat. props is a list of
+        (name, value) pairs as returned by get_property_list."""
+        out = []
+        self.write_element(
+            out,
+            "response",
+            [
+                ("href", href),
+                ("propstat", [("prop", props), ("status", status)]),
+            ],
+            level=1,
+        )
+        return b"".join(out)
+
+    def status_response(self, href, status):
+        """Serialize a D:response carrying a status for the href instead of properties."""
+        out = []
+        self.write_element(
+            out, "response", [("href", href), ("status", status)], level=1
+        )
+        return b"".join(out)
+
+    def iter_document(self, fragments, chunk_size=STREAMING_CHUNK_SIZE):
+        """Wrap serialized D:response fragments into a multistatus document, yielding
+        chunks of roughly chunk_size bytes."""
+        chunk = [self.declaration + self.open + self.newline]
+        size = 0
+        empty = True
+        for fragment in fragments:
+            empty = False
+            chunk.append(fragment)
+            size += len(fragment)
+            if size >= chunk_size:
+                yield b"".join(chunk)
+                chunk = []
+                size = 0
+        if empty:
+            yield self.declaration + self.empty + self.newline
+            return
+        chunk.append(self.close + self.newline)
+        yield b"".join(chunk)
+
+    def document(self, fragments):
+        return b"".join(self.iter_document(fragments))
 
 
 def safe_join(root, *paths):
@@ -104,16 +287,38 @@ def ns_join(ns, name):
     return "{%s:}%s" % (ns, name)
 
 
+def _memoized_date(memo, key, format_date, dt):
+    try:
+        return memo[key]
+    except KeyError:
+        pass
+    if len(memo) >= DATE_MEMO_SIZE:
+        memo.clear()
+    value = memo[key] = format_date(dt)
+    return value
+
+
+def _format_rfc3339_date(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
 def rfc3339_date(dt):
     if not dt:
         return ""
-    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if not isinstance(dt, datetime):
+        return _format_rfc3339_date(dt)
+    # listings format the same few timestamps over and over, so look them up by second
+    key = (dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
+    return _memoized_date(_rfc3339_memo, key, _format_rfc3339_date, dt)
 
 
 def rfc1123_date(dt):
     if not dt:
         return ""
-    return rfc2822_date(dt)
+    if not isinstance(dt, datetime):
+        return rfc2822_date(dt)
+    key = (dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.utcoffset())
+    return _memoized_date(_rfc1123_memo, key, rfc2822_date, dt)
 
 
 def parse_time(timestring):
@@ -134,6 +339,77 @@ def parse_time(timestring):
     return calendar.timegm(value)
 
 
+def etag_matches(etag, header):
+    """Check an entity tag against the value of an If-Match / If-None-Match header,
+    using the weak comparison function."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/").strip('"')
+    return any(
+        e.strip().removeprefix("W/").strip('"') == etag for e in header.split(",")
+    )
+
+
+def encode_page_token(name):
+    """Encode the name of the last child of a page into an opaque continuation token."""
+    return urlsafe_b64encode(name.encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(token):
+    """Decode a continuation token, raises ValueError if it is malformed."""
+    try:
+        return urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("Invalid page token %r" % token) from e
+
+
+def negotiate_content_coding(accept_encoding, codings=("gzip", "deflate")):
+    """Pick the content coding the client prefers from an Accept-Encoding header, or
+    None if it accepts none of the given codings."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for coding in codings:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def get_compressor(coding, level=6):
+    """Return a zlib compressor for the gzip or deflate (zlib format) content coding."""
+    wbits = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}[coding]
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+def compress(content, coding, level=6):
+    compressor = get_compressor(coding, level)
+    return compressor.compress(content) + compressor.flush()
+
+
+def iter_compressed(chunks, coding, level=6):
+    """Compress a stream of chunks, flushing after every chunk so clients can start
+    decoding before the whole body has been produced."""
+    compressor = get_compressor(coding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 def rfc5987_content_disposition(file_name, disposition_type="attachment"):
     """
     Proccesses a filename that might contain unicode data, and returns it as a proper rfc 5987 compatible header
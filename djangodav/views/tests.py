@@ -24,19 +24,26 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import zlib
+from copy import deepcopy
+from io import BytesIO
+
 from django.http import Http404, HttpResponse
 from django.http import HttpRequest as OriginalHttpRequest
 from lxml import etree
 from lxml.etree import ElementTree
 from mock import Mock
 
+from djangodav import signals
 from djangodav.acls import FullAcl
+from djangodav.base.resources import BaseDavResource
 from djangodav.base.tests.resources import (
     MissingMockCollection,
     MissingMockObject,
     MockCollection,
     MockObject,
 )
+from djangodav.cache import LRUFragmentCache
 from djangodav.fs.tests import TestCase, patch
 from djangodav.locks import DummyLock
 from djangodav.utils import WEBDAV_NSMAP, D
@@ -182,6 +189,463 @@ class TestView(TestCase):
             ),
         )
 
+    def test_propfind_streaming(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = Mock(META={})
+        path = "/collection/"
+        v = DavView(base_url="/base/", path=path, request=request, acl_class=FullAcl)
+        v.__dict__["resource"] = self.top_collection
+        expected = v.propfind(request, path, None)
+        v.propfind_streaming = True
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.assertTrue(resp.streaming)
+        tree = etree.fromstring(b"".join(resp.streaming_content))
+        self.assertEqual(
+            etree.tostring(tree, method="c14n"),
+            etree.tostring(etree.fromstring(expected.content), method="c14n"),
+        )
+
+    def test_propfind_fast_serializer(self):
+        special = MockObject(
+            path="/collection/\xe9 & <special>\r",
+            get_descendants=Mock(return_value=[]),
+        )
+        self.top_collection.get_descendants.return_value += [
+            self.top_collection,
+            special,
+        ]
+        request = Mock(META={})
+        path = "/collection/"
+        for xbody in [
+            None,
+            D.propfind(D.prop(D.displayname(), D.resourcetype(), D.unknown())),
+            D.propfind(D.allprop()),
+            D.propfind(D.propname()),
+        ]:
+            if xbody is not None:
+                xbody = etree.XPathDocumentEvaluator(
+                    ElementTree(xbody), namespaces=WEBDAV_NSMAP
+                )
+            for pretty_print in (True, False):
+                for encoding in ("utf-8", "ascii"):
+                    v = DavView(
+                        base_url="/base/",
+                        path=path,
+                        request=request,
+                        acl_class=FullAcl,
+                        xml_pretty_print=pretty_print,
+                        xml_encoding=encoding,
+                    )
+                    v.__dict__["resource"] = self.top_collection
+                    expected = v.propfind(request, path, xbody)
+                    v.propfind_fast_serializer = True
+                    resp = v.propfind(request, path, xbody)
+                    self.assertEqual(resp.status_code, 207)
+                    self.assertEqual(resp.content, expected.content)
+
+    def test_propfind_fast_serializer_empty(self):
+        request = Mock(META={})
+        path = "/blank_collection/"
+        v = DavView(base_url="/base/", path=path, request=request, acl_class=FullAcl)
+        v.__dict__["resource"] = self.blank_collection
+        expected = v.propfind(request, path, None)
+        v.propfind_fast_serializer = True
+        self.assertEqual(v.propfind(request, path, None).content, expected.content)
+
+    def test_propfind_cache(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = Mock(META={})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_cache=LRUFragmentCache(),
+        )
+        v.__dict__["resource"] = self.top_collection
+        expected = v.propfind(request, path, None)
+        self.assertEqual(len(v.propfind_cache.fragments), 3)
+
+        with patch.object(v, "get_propfind_properties") as get_propfind_properties:
+            resp = v.propfind(request, path, None)
+            self.assertEqual(resp.content, expected.content)
+            self.assertFalse(get_propfind_properties.called)
+
+            self.sub_object.getetag = "1" * 40
+            get_propfind_properties.return_value = [[]]
+            v.propfind(request, path, None)
+            get_propfind_properties.assert_called_once_with(
+                [self.sub_object], False, False, locks=None
+            )
+
+    def test_propfind_bulk_properties(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = Mock(META={})
+        path = "/collection/"
+        v = DavView(base_url="/base/", path=path, request=request, acl_class=FullAcl)
+        v.__dict__["resource"] = self.top_collection
+        expected = v.propfind(request, path, None)
+        v.propfind_batch_size = 2
+        with patch(
+            "djangodav.base.resources.BaseDavResource.bulk_properties",
+            side_effect=BaseDavResource.bulk_properties,
+        ) as bulk_properties:
+            resp = v.propfind(request, path, None)
+        self.assertEqual(resp.content, expected.content)
+        self.assertEqual(
+            [call[0][0] for call in bulk_properties.call_args_list],
+            [[self.sub_object, self.sub_collection], [self.top_collection]],
+        )
+
+    def test_propfind_lock_properties(self):
+        request = Mock(META={})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            lock_class=DummyLock,
+        )
+        v.__dict__["resource"] = self.top_collection
+        xbody = etree.XPathDocumentEvaluator(
+            ElementTree(D.propfind(D.prop(D.lockdiscovery(), D.supportedlock()))),
+            namespaces=WEBDAV_NSMAP,
+        )
+        lock = {
+            "token": "123",
+            "lockscope": "exclusive",
+            "locktype": "write",
+            "depth": 0,
+            "timeout": 600,
+            "owner": "someone",
+        }
+        supportedlock = D.supportedlock(
+            D.lockentry(D.lockscope(D.exclusive()), D.locktype(D.write())),
+            D.lockentry(D.lockscope(D.shared()), D.locktype(D.write())),
+        )
+        with patch.object(
+            DummyLock, "get_locks_for", return_value=[[lock], []]
+        ) as get_locks_for:
+            resp = v.propfind(request, path, xbody)
+            get_locks_for.assert_called_once_with(
+                [self.sub_object, self.sub_collection]
+            )
+            v.propfind_fast_serializer = True
+            self.assertEqual(v.propfind(request, path, xbody).content, resp.content)
+        self.assertEqual(
+            resp.content,
+            etree.tostring(
+                D.multistatus(
+                    D.response(
+                        D.href("/base/collection/sub_object"),
+                        D.propstat(
+                            D.prop(
+                                supportedlock,
+                                D.lockdiscovery(
+                                    D.activelock(
+                                        D.locktype(D.write()),
+                                        D.lockscope(D.exclusive()),
+                                        D.depth("0"),
+                                        D.owner("someone"),
+                                        D.timeout("Second-600"),
+                                        D.locktoken(D.href("opaquelocktoken:123")),
+                                    )
+                                ),
+                            ),
+                            D.status("HTTP/1.1 200 OK"),
+                        ),
+                    ),
+                    D.response(
+                        D.href("/base/collection/sub_colection/"),
+                        D.propstat(
+                            D.prop(deepcopy(supportedlock), D.lockdiscovery()),
+                            D.status("HTTP/1.1 200 OK"),
+                        ),
+                    ),
+                ),
+                xml_declaration=True,
+                encoding="utf-8",
+            ),
+        )
+
+    def test_lru_fragment_cache(self):
+        cache = LRUFragmentCache(maxsize=2)
+        cache.set("a", b"A")
+        cache.set("b", b"B")
+        self.assertEqual(cache.get("a"), b"A")
+        cache.set("c", b"C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"A")
+        self.assertEqual(cache.get("c"), b"C")
+
+    def test_propfind_conditional(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = HttpRequest()
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_conditional=True,
+        )
+        v.__dict__["resource"] = self.top_collection
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        etag = resp["ETag"]
+
+        request.META["HTTP_IF_NONE_MATCH"] = etag
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+
+        self.sub_object.getetag = "1" * 40
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_options_not_compressed(self):
+        request = Mock(META={"HTTP_ACCEPT_ENCODING": "gzip"})
+        v = DavView(
+            path="/",
+            request=request,
+            acl_class=FullAcl,
+            xml_compression=True,
+            xml_compression_min_size=0,
+        )
+        v.__dict__["resource"] = self.top_collection
+        resp = v.options(request, "/")
+        self.assertNotIn("Content-Encoding", resp)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["Content-Length"], "0")
+
+    def test_propfind_conditional_compressed(self):
+        request = HttpRequest()
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_conditional=True,
+            xml_compression=True,
+            xml_compression_min_size=0,
+        )
+        v.__dict__["resource"] = self.top_collection
+        etag = v.propfind(request, path, None)["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        request.META["HTTP_ACCEPT_ENCODING"] = "gzip"
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(resp["ETag"], "W/" + etag)
+
+        request.META["HTTP_IF_NONE_MATCH"] = resp["ETag"]
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], "W/" + etag)
+
+    def test_propfind_conditional_locks(self):
+        request = HttpRequest()
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            lock_class=DummyLock,
+            propfind_conditional=True,
+        )
+        v.__dict__["resource"] = self.top_collection
+        etag = v.propfind(request, path, None)["ETag"]
+        with patch.object(DummyLock, "get_tree_version", return_value=1):
+            self.assertNotEqual(v.propfind(request, path, None)["ETag"], etag)
+        with patch.object(DummyLock, "get_tree_version", return_value=None):
+            self.assertNotIn("ETag", v.propfind(request, path, None))
+
+    def test_propfind_conditional_page(self):
+        self.top_collection.get_children = Mock(return_value=[self.sub_object])
+        request = Mock(META={"HTTP_X_PAGE_SIZE": "1"})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_conditional=True,
+            propfind_pagination=True,
+        )
+        v.__dict__["resource"] = self.top_collection
+        v.get_propfind_etag = Mock()
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.assertNotIn("ETag", resp)
+        self.assertFalse(v.get_propfind_etag.called)
+
+    def test_propfind_conditional_budget(self):
+        request = Mock(META={"HTTP_DEPTH": "infinity"})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_conditional=True,
+            propfind_max_entries=2,
+        )
+        v.__dict__["resource"] = self.top_collection
+        v.get_propfind_etag = Mock()
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.assertNotIn("ETag", resp)
+        self.assertFalse(v.get_propfind_etag.called)
+
+    def test_propfind_reject_infinite_depth(self):
+        request = Mock(META={"HTTP_DEPTH": "infinity"})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_infinite_depth=False,
+        )
+        v.__dict__["resource"] = self.top_collection
+        receiver = Mock()
+        signals.propfind_depth_limited.connect(receiver)
+        self.addCleanup(signals.propfind_depth_limited.disconnect, receiver)
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(
+            etree.fromstring(resp.content)[0].tag, "{DAV:}propfind-finite-depth"
+        )
+        self.assertEqual(receiver.call_args[1]["action"], "rejected")
+        self.assertFalse(self.top_collection.get_descendants.called)
+
+    def test_propfind_infinite_depth_budget(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = Mock(META={"HTTP_DEPTH": "infinity"})
+        path = "/collection/"
+        receiver = Mock()
+        signals.propfind_depth_limited.connect(receiver)
+        self.addCleanup(signals.propfind_depth_limited.disconnect, receiver)
+        for budget in [
+            {"propfind_max_entries": 2},
+            {"propfind_max_memory": 800},
+            {"propfind_max_entries": 2, "propfind_fast_serializer": True},
+        ]:
+            v = DavView(
+                base_url="/base/", path=path, request=request, acl_class=FullAcl
+            )
+            for key, value in budget.items():
+                setattr(v, key, value)
+            v.__dict__["resource"] = self.top_collection
+            resp = v.propfind(request, path, None)
+            self.assertEqual(resp.status_code, 207)
+            responses = etree.fromstring(resp.content)
+            self.assertEqual(len(responses), 3)
+            self.assertEqual(
+                responses[-1].findtext("{DAV:}status"),
+                "HTTP/1.1 507 Insufficient Storage",
+            )
+            self.assertEqual(responses[-1].findtext("{DAV:}href"), "/base/collection/")
+            self.assertEqual(receiver.call_args[1]["action"], "truncated")
+
+    def test_propfind_pagination(self):
+        self.top_collection.get_children = Mock(
+            return_value=[self.sub_collection, self.sub_object]
+        )
+        request = Mock(META={"HTTP_X_PAGE_SIZE": "1"})
+        path = "/collection/"
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            propfind_pagination=True,
+        )
+        v.__dict__["resource"] = self.top_collection
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.top_collection.get_children.assert_called_with(start_after=None, limit=2)
+        self.assertEqual(
+            [r.findtext("{DAV:}href") for r in etree.fromstring(resp.content)],
+            ["/base/collection/", "/base/collection/sub_colection/"],
+        )
+        self.assertFalse(self.top_collection.get_descendants.called)
+
+        request.META["HTTP_X_PAGE_TOKEN"] = resp["X-Next-Page-Token"]
+        self.top_collection.get_children.return_value = [self.sub_object]
+        resp = v.propfind(request, path, None)
+        self.top_collection.get_children.assert_called_with(
+            start_after="sub_colection", limit=2
+        )
+        self.assertEqual(
+            [r.findtext("{DAV:}href") for r in etree.fromstring(resp.content)],
+            ["/base/collection/sub_object"],
+        )
+        self.assertNotIn("X-Next-Page-Token", resp)
+
+    def test_propfind_compression(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        path = "/collection/"
+        for accept_encoding, coding, wbits in [
+            ("gzip, deflate", "gzip", 31),
+            ("gzip;q=0.5, deflate", "deflate", 15),
+        ]:
+            for streaming in (False, True):
+                request = Mock(META={"HTTP_ACCEPT_ENCODING": accept_encoding})
+                v = DavView(
+                    base_url="/base/",
+                    path=path,
+                    request=request,
+                    acl_class=FullAcl,
+                )
+                v.__dict__["resource"] = self.top_collection
+                expected = v.propfind(request, path, None).content
+                v.xml_compression = True
+                v.xml_compression_min_size = 100
+                v.propfind_streaming = streaming
+                resp = v.propfind(request, path, None)
+                self.assertEqual(resp["Content-Encoding"], coding)
+                self.assertEqual(resp["Vary"], "Accept-Encoding")
+                if streaming:
+                    content = b"".join(resp.streaming_content)
+                else:
+                    content = resp.content
+                content = zlib.decompress(content, wbits)
+                if streaming:
+                    self.assertEqual(
+                        etree.tostring(etree.fromstring(content), method="c14n"),
+                        etree.tostring(etree.fromstring(expected), method="c14n"),
+                    )
+                else:
+                    self.assertEqual(content, expected)
+
+    def test_propfind_compression_not_accepted(self):
+        path = "/collection/"
+        for meta, min_size in [
+            ({"HTTP_ACCEPT_ENCODING": "gzip"}, 10000),
+            ({"HTTP_ACCEPT_ENCODING": "gzip;q=0, br"}, 100),
+            ({}, 100),
+        ]:
+            request = Mock(META=meta)
+            v = DavView(
+                base_url="/base/",
+                path=path,
+                request=request,
+                acl_class=FullAcl,
+                xml_compression=True,
+                xml_compression_min_size=min_size,
+            )
+            v.__dict__["resource"] = self.top_collection
+            resp = v.propfind(request, path, None)
+            self.assertNotIn("Content-Encoding", resp)
+            etree.fromstring(resp.content)
+
     def test_propfind_exact_names(self):
         self.sub_object.get_descendants.return_value += [self.sub_object]
         request = Mock(META={})
@@ -342,6 +806,183 @@ class TestView(TestCase):
         self.assertEqual(v.base_url, "/base")
         self.assertEqual(v.path, "/path/")
 
+    def test_dispatch_xml_body_too_large(self):
+        request = Mock(
+            spec=HttpRequest,
+            META={
+                "PATH_INFO": "/base/path/",
+                "CONTENT_TYPE": "text/xml",
+                "CONTENT_LENGTH": "44",
+            },
+            method="PROPFIND",
+            read=Mock(side_effect=AssertionError("body must not be read")),
+        )
+        v = DavView(
+            request=request,
+            propfind=Mock(return_value=HttpResponse()),
+            xml_max_body_size=10,
+        )
+        resp = v.dispatch(request, "/path/")
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(v.propfind.called)
+
+    def test_dispatch_large_proppatch(self):
+        body = (
+            b'<?xml version="1.0" encoding="utf-8"?>\n'
+            b'<!DOCTYPE D:propertyupdate [<!ENTITY e "entity">]>'
+            b'<D:propertyupdate xmlns:D="DAV:" xmlns:Z="urn:z"><D:set><D:prop>'
+            b"<Z:first>&e;</Z:first><Z:second><Z:value>%s</Z:value></Z:second>"
+            b"</D:prop></D:set><D:remove><D:prop><Z:third/></D:prop></D:remove>"
+            b"</D:propertyupdate>" % (b"x" * 100)
+        )
+        request = Mock(
+            spec=HttpRequest,
+            META={
+                "PATH_INFO": "/base/path/",
+                "CONTENT_TYPE": "text/xml",
+                "CONTENT_LENGTH": str(len(body)),
+            },
+            method="PROPPATCH",
+            read=BytesIO(body).read,
+        )
+        v = DavView(
+            request=request,
+            proppatch=Mock(return_value=HttpResponse()),
+            xml_max_body_size=10,
+        )
+        v.dispatch(request, "/path/")
+        props = v.xbody("/D:propertyupdate/D:set/D:prop/*")
+        self.assertEqual([p.tag for p in props], ["{urn:z}first", "{urn:z}second"])
+        self.assertEqual([len(p) for p in props], [0, 0])
+        self.assertEqual([p.text for p in props], [None, None])
+        props = v.xbody("/D:propertyupdate/D:remove/D:prop/*")
+        self.assertEqual([p.tag for p in props], ["{urn:z}third"])
+
+    def test_dispatch_proppatch_too_large(self):
+        request = Mock(
+            spec=HttpRequest,
+            META={
+                "PATH_INFO": "/base/path/",
+                "CONTENT_TYPE": "text/xml",
+                "CONTENT_LENGTH": "100",
+            },
+            method="PROPPATCH",
+            read=Mock(side_effect=AssertionError("body must not be read")),
+        )
+        v = DavView(
+            request=request,
+            proppatch=Mock(return_value=HttpResponse()),
+            xml_max_body_size=10,
+            proppatch_max_body_size=50,
+        )
+        resp = v.dispatch(request, "/path/")
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(v.proppatch.called)
+
+    def test_dispatch_entities_not_resolved(self):
+        body = (
+            b'<!DOCTYPE D:propfind [<!ENTITY e "entity">]>'
+            b'<D:propfind xmlns:D="DAV:"><D:prop><D:displayname>&e;</D:displayname>'
+            b"</D:prop></D:propfind>"
+        )
+        request = Mock(
+            spec=HttpRequest,
+            META={
+                "PATH_INFO": "/base/path/",
+                "CONTENT_TYPE": "text/xml",
+                "CONTENT_LENGTH": str(len(body)),
+            },
+            method="PROPFIND",
+            read=BytesIO(body).read,
+        )
+        v = DavView(request=request, propfind=Mock(return_value=HttpResponse()))
+        v.dispatch(request, "/path/")
+        self.assertIsNone(v.xbody("/D:propfind/D:prop/D:displayname")[0].text)
+
+    def test_report_multiget(self):
+        request = Mock(META={})
+        path = "/collection/"
+        resources = {
+            "/collection/sub_object": self.sub_object,
+            "/collection/missing_sub_object": self.missing_sub_object,
+        }
+        resource_class = Mock(side_effect=lambda path, user: resources[path])
+        v = DavView(
+            base_url="/base/",
+            path=path,
+            request=request,
+            acl_class=FullAcl,
+            resource_class=resource_class,
+        )
+        v.__dict__["resource"] = self.top_collection
+        xbody = etree.XPathDocumentEvaluator(
+            ElementTree(
+                D.multiget(
+                    D.prop(D.displayname()),
+                    D.href("/base/collection/sub_object"),
+                    D.href("/base/collection/missing_sub_object"),
+                    D.href("/elsewhere/object"),
+                )
+            ),
+            namespaces=WEBDAV_NSMAP,
+        )
+        resp = v.report(request, path, xbody)
+        self.assertEqual(resp.status_code, 207)
+        resource_class.bulk_prefetch.assert_called_once_with(
+            [self.sub_object, self.missing_sub_object]
+        )
+        self.assertEqual(
+            resp.content,
+            etree.tostring(
+                D.multistatus(
+                    D.response(
+                        D.href("/base/collection/sub_object"),
+                        D.propstat(
+                            D.prop(D.displayname("sub_object")),
+                            D.status("HTTP/1.1 200 OK"),
+                        ),
+                    ),
+                    D.response(
+                        D.href("/elsewhere/object"),
+                        D.status("HTTP/1.1 404 Not Found"),
+                    ),
+                    D.response(
+                        D.href("/base/collection/missing_sub_object"),
+                        D.status("HTTP/1.1 404 Not Found"),
+                    ),
+                ),
+                xml_declaration=True,
+                encoding="utf-8",
+            ),
+        )
+        v.propfind_fast_serializer = True
+        self.assertEqual(v.report(request, path, xbody).content, resp.content)
+
+    def test_get_href_path(self):
+        v = DavView(base_url="/base/")
+        self.assertEqual(v.get_href_path("/base/collection/"), "/collection/")
+        self.assertEqual(v.get_href_path("http://host/base//a%20b"), "/a b")
+        self.assertIsNone(v.get_href_path("/base/../secret.txt"))
+        self.assertIsNone(v.get_href_path("/base/%2e%2e/secret.txt"))
+        self.assertIsNone(v.get_href_path("/base/./collection/"))
+        self.assertIsNone(v.get_href_path("/elsewhere/object"))
+
+    def test_report_unsupported(self):
+        request = Mock(META={})
+        v = DavView(base_url="/base/", path="/", request=request, acl_class=FullAcl)
+        v.__dict__["resource"] = self.top_collection
+        for root in [
+            D("version-tree"),
+            etree.Element("{urn:ietf:params:xml:ns:caldav}calendar-multiget"),
+            etree.Element("{urn:foo}bogus-multiget"),
+        ]:
+            xbody = etree.XPathDocumentEvaluator(
+                ElementTree(root), namespaces=WEBDAV_NSMAP
+            )
+            resp = v.report(request, "/", xbody)
+            self.assertEqual(resp.status_code, 403)
+            self.assertIn(b"supported-report", resp.content)
+
     def test_allowed_object(self):
         v = DavView()
         v.__dict__["resource"] = self.sub_object
@@ -360,6 +1001,7 @@ class TestView(TestCase):
                 "MOVE",
                 "PUT",
                 "MKCOL",
+                "REPORT",
             ],
         )
 
@@ -381,6 +1023,7 @@ class TestView(TestCase):
                 "MOVE",
                 "PUT",
                 "MKCOL",
+                "REPORT",
             ],
         )
 
@@ -405,6 +1048,7 @@ class TestView(TestCase):
                 "MOVE",
                 "PUT",
                 "MKCOL",
+                "REPORT",
             ],
         )
 
@@ -429,6 +1073,7 @@ class TestView(TestCase):
                 "MOVE",
                 "PUT",
                 "MKCOL",
+                "REPORT",
             ],
         )
 
@@ -613,11 +1258,28 @@ class TestView(TestCase):
         )
         v.__dict__["resource"] = target
         request = HttpRequest()
-        target.delete = Mock()
+        target.delete = Mock(return_value=None)
         resp = v.delete(request, target.get_path())
         self.assertTrue(target.delete.called)
         self.assertEqual(204, resp.status_code)
 
+    def test_delete_errors(self):
+        target = self.top_collection
+        v = DavView(
+            base_url="/base",
+            path=target.get_path(),
+            acl_class=FullAcl,
+            resource_class=Mock(),
+            lock_class=DummyLock,
+        )
+        v.__dict__["resource"] = target
+        request = HttpRequest()
+        target.delete = Mock(return_value=[(self.sub_object, "HTTP/1.1 423 Locked")])
+        resp = v.delete(request, target.get_path())
+        self.assertEqual(207, resp.status_code)
+        self.assertIn(b"<D:href>/base/collection/sub_object</D:href>", resp.content)
+        self.assertIn(b"<D:status>HTTP/1.1 423 Locked</D:status>", resp.content)
+
     def test_delete_missing(self):
         target = self.missing_sub_object
         v = DavView(
@@ -655,6 +1317,39 @@ class TestView(TestCase):
         self.assertEqual(201, resp.status_code)
         self.assertTrue(src.copy.called)
 
+    def test_copy_errors(self):
+        src = self.top_collection
+        src.copy = Mock(return_value=[(self.sub_object, "HTTP/1.1 403 Forbidden")])
+        dst = self.missing_sub_collection
+        request = HttpRequest()
+        request.META["HTTP_DESTINATION"] = "http://testserver%s" % dst.get_path()
+        request.META["SERVER_NAME"] = "testserver"
+        request.META["SERVER_PORT"] = "80"
+        v = DavView(
+            base_url="/base",
+            request=request,
+            path=src.get_path(),
+            acl_class=FullAcl,
+            lock_class=DummyLock,
+        )
+        v.resource_class = Mock(return_value=dst)
+        v.__dict__["resource"] = src
+        resp = v.copy(request, src.get_path(), None)
+        self.assertEqual(207, resp.status_code)
+        self.assertEqual(
+            resp.content,
+            etree.tostring(
+                D.multistatus(
+                    D.response(
+                        D.href("/base/collection/sub_object"),
+                        D.status("HTTP/1.1 403 Forbidden"),
+                    )
+                ),
+                xml_declaration=True,
+                encoding="utf-8",
+            ),
+        )
+
     def test_copy_overwrite(self):
         src = self.sub_object
         src.copy = Mock(return_value=None)
@@ -682,6 +1377,31 @@ class TestView(TestCase):
         self.assertTrue(src.copy.called)
         self.assertTrue(dst.delete.called)
 
+    def test_copy_overwrite_errors(self):
+        src = self.sub_object
+        src.copy = Mock(return_value=None)
+        dst = self.blank_collection
+        dst.delete = Mock(return_value=[(self.sub_object, "HTTP/1.1 403 Forbidden")])
+        request = HttpRequest()
+        request.META["HTTP_DESTINATION"] = (
+            "http://testserver%s" % dst.get_escaped_path()
+        )
+        request.META["SERVER_NAME"] = "testserver"
+        request.META["SERVER_PORT"] = "80"
+        v = DavView(
+            base_url="/base",
+            request=request,
+            path=src.get_path(),
+            acl_class=FullAcl,
+            lock_class=DummyLock,
+        )
+        v.resource_class = Mock(return_value=dst)
+        v.__dict__["resource"] = src
+        resp = v.copy(request, src.get_path(), None)
+        self.assertEqual(207, resp.status_code)
+        self.assertIn(b"HTTP/1.1 403 Forbidden", resp.content)
+        self.assertFalse(src.copy.called)
+
     def test_move_new(self):
         src = self.sub_object
         src.move = Mock(return_value=None)
@@ -1,6 +1,10 @@
 import logging
 import os
+import posixpath
 import re
+import time
+from hashlib import md5
+from itertools import chain, islice
 from urllib import parse as urlparse
 from urllib.parse import quote as urlquote
 
@@ -13,16 +17,19 @@ from django.http import (
     HttpResponseBadRequest,
     HttpResponseForbidden,
     HttpResponseNotAllowed,
+    HttpResponseNotModified,
     HttpResponseRedirect,
 )
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 from lxml import etree
-from lxml.etree import parse
 
+from djangodav import signals
+from djangodav.parsers import parse_propertyupdate, parse_xml
 from djangodav.responses import (
     HttpResponseBadGateway,
     HttpResponseConflict,
@@ -32,12 +39,21 @@ from djangodav.responses import (
     HttpResponseMultiStatus,
     HttpResponseNoContent,
     HttpResponsePreconditionFailed,
+    HttpResponseRequestEntityTooLarge,
     ResponseException,
+    StreamingHttpResponseMultiStatus,
 )
 from djangodav.utils import (
-    WEBDAV_NSMAP,
     D,
-    get_property_tag_list,
+    MultistatusSerializer,
+    compress,
+    decode_page_token,
+    encode_page_token,
+    etag_matches,
+    iter_compressed,
+    iter_multistatus,
+    negotiate_content_coding,
+    property_element,
     rfc1123_date,
     rfc5987_content_disposition,
     url_join,
@@ -48,6 +64,47 @@ PATTERN_CONTENT_RANGE = re.compile(r"^\s*bytes\s*([0-9]*)-.*$")
 # get settings
 DJANGODAV_X_REDIRECT = getattr(settings, "DJANGODAV_X_REDIRECT", None)
 DJANGODAV_X_REDIRECT_PREFIX = getattr(settings, "DJANGODAV_X_REDIRECT_PREFIX", "")
+DJANGODAV_PROPFIND_STREAMING = getattr(settings, "DJANGODAV_PROPFIND_STREAMING", False)
+DJANGODAV_PROPFIND_CONDITIONAL = getattr(
+    settings, "DJANGODAV_PROPFIND_CONDITIONAL", False
+)
+DJANGODAV_PROPFIND_FAST_SERIALIZER = getattr(
+    settings, "DJANGODAV_PROPFIND_FAST_SERIALIZER", False
+)
+DJANGODAV_PROPFIND_PAGINATION = getattr(
+    settings, "DJANGODAV_PROPFIND_PAGINATION", False
+)
+DJANGODAV_PROPFIND_MAX_PAGE_SIZE = getattr(
+    settings, "DJANGODAV_PROPFIND_MAX_PAGE_SIZE", None
+)
+DJANGODAV_PROPFIND_INFINITE_DEPTH = getattr(
+    settings, "DJANGODAV_PROPFIND_INFINITE_DEPTH", True
+)
+DJANGODAV_PROPFIND_MAX_ENTRIES = getattr(
+    settings, "DJANGODAV_PROPFIND_MAX_ENTRIES", None
+)
+DJANGODAV_PROPFIND_MAX_SECONDS = getattr(
+    settings, "DJANGODAV_PROPFIND_MAX_SECONDS", None
+)
+DJANGODAV_PROPFIND_MAX_MEMORY = getattr(settings, "DJANGODAV_PROPFIND_MAX_MEMORY", None)
+DJANGODAV_XML_COMPRESSION = getattr(settings, "DJANGODAV_XML_COMPRESSION", False)
+DJANGODAV_XML_COMPRESSION_MIN_SIZE = getattr(
+    settings, "DJANGODAV_XML_COMPRESSION_MIN_SIZE", 1024
+)
+DJANGODAV_XML_COMPRESSION_LEVEL = getattr(
+    settings, "DJANGODAV_XML_COMPRESSION_LEVEL", 6
+)
+DJANGODAV_XML_MAX_BODY_SIZE = getattr(
+    settings, "DJANGODAV_XML_MAX_BODY_SIZE", 1024 * 1024
+)
+DJANGODAV_PROPPATCH_MAX_BODY_SIZE = getattr(
+    settings, "DJANGODAV_PROPPATCH_MAX_BODY_SIZE", 16 * 1024 * 1024
+)
+
+PROPFIND_PARTIAL_STATUS = "HTTP/1.1 507 Insufficient Storage"
+LOCK_PROPERTIES = ["supportedlock", "lockdiscovery"]
+# the root element of the only REPORT body supported, a multiget in the DAV: namespace
+MULTIGET_REPORT = "{DAV:}multiget"
 
 log = logging.getLogger(__name__)
 
@@ -75,11 +132,40 @@ class DavView(TemplateView):
         "move",
         "lock",
         "unlock",
+        "report",
     ]
     server_header = "DjangoDav"
 
     xml_pretty_print = False
     xml_encoding = "utf-8"
+    # gzip/deflate XML responses for clients that accept it
+    xml_compression = DJANGODAV_XML_COMPRESSION
+    xml_compression_min_size = DJANGODAV_XML_COMPRESSION_MIN_SIZE
+    xml_compression_level = DJANGODAV_XML_COMPRESSION_LEVEL
+    # larger XML request bodies are refused with 413, PROPPATCH is parsed incrementally
+    xml_max_body_size = DJANGODAV_XML_MAX_BODY_SIZE
+    # the hard limit for PROPPATCH bodies, which are parsed incrementally
+    proppatch_max_body_size = DJANGODAV_PROPPATCH_MAX_BODY_SIZE
+    # stream PROPFIND multistatus bodies instead of building the whole tree in memory
+    propfind_streaming = DJANGODAV_PROPFIND_STREAMING
+    # serialize PROPFIND responses from byte templates instead of lxml elements
+    propfind_fast_serializer = DJANGODAV_PROPFIND_FAST_SERIALIZER
+    # a djangodav.base.cache.BaseFragmentCache instance caching serialized responses
+    propfind_cache = None
+    # number of resources whose properties are fetched with one bulk_properties call
+    propfind_batch_size = 256
+    # send an ETag with PROPFIND responses and honor If-None-Match
+    propfind_conditional = DJANGODAV_PROPFIND_CONDITIONAL
+    # Depth: infinity policy for PROPFIND: refuse it altogether, or cap it by number of
+    # entries, seconds or bytes of serialized responses and return a partial multistatus
+    propfind_infinite_depth = DJANGODAV_PROPFIND_INFINITE_DEPTH
+    propfind_max_entries = DJANGODAV_PROPFIND_MAX_ENTRIES
+    propfind_max_seconds = DJANGODAV_PROPFIND_MAX_SECONDS
+    propfind_max_memory = DJANGODAV_PROPFIND_MAX_MEMORY
+    # allow clients to list Depth: 1 in pages, ordered by name, with the X-Page-Size
+    # header (or D:limit/D:nresults) and the X-Page-Token returned by the previous page
+    propfind_pagination = DJANGODAV_PROPFIND_PAGINATION
+    propfind_max_page_size = DJANGODAV_PROPFIND_MAX_PAGE_SIZE
 
     def no_access(self):
         return HttpResponseForbidden()
@@ -98,18 +184,7 @@ class DavView(TemplateView):
 
         self.user = request.user
 
-        meta = request.META.get
         self.xbody = kwargs["xbody"] = None
-        if (
-            request.method.lower() != "put"
-            and "/xml" in meta("CONTENT_TYPE", "")
-            and meta("CONTENT_LENGTH", 0) != ""
-            and int(meta("CONTENT_LENGTH", 0)) > 0
-        ):
-            self.xbody = kwargs["xbody"] = etree.XPathDocumentEvaluator(
-                parse(request, etree.XMLParser(ns_clean=True, resolve_entities=True)),
-                namespaces=WEBDAV_NSMAP,
-            )
 
         if request.method.upper() in self._allowed_methods():
             handler = getattr(
@@ -118,6 +193,7 @@ class DavView(TemplateView):
         else:
             handler = self.http_method_not_allowed
         try:
+            self.xbody = kwargs["xbody"] = self.parse_xml_body(request)
             resp = handler(request, self.path, *args, **kwargs)
         except ResponseException as e:
             log.exception(e)
@@ -139,6 +215,36 @@ class DavView(TemplateView):
             resp["Server"] = self.server_header
         return resp
 
+    def parse_xml_body(self, request):
+        """Parse the XML body of the request, if any. Bodies larger than
+        xml_max_body_size are refused, except for PROPPATCH, which is parsed
+        incrementally instead up to proppatch_max_body_size."""
+        meta = request.META.get
+        if (
+            request.method.lower() == "put"
+            or "/xml" not in meta("CONTENT_TYPE", "")
+            or meta("CONTENT_LENGTH", 0) == ""
+            or int(meta("CONTENT_LENGTH", 0)) <= 0
+        ):
+            return None
+        size = int(meta("CONTENT_LENGTH"))
+        proppatch = request.method.lower() == "proppatch"
+        limit = self.proppatch_max_body_size if proppatch else self.xml_max_body_size
+        if limit is not None and size > limit:
+            raise ResponseException(
+                HttpResponseRequestEntityTooLarge("XML body too large")
+            )
+        try:
+            if (
+                proppatch
+                and self.xml_max_body_size is not None
+                and size > self.xml_max_body_size
+            ):
+                return parse_propertyupdate(request)
+            return parse_xml(request)
+        except etree.XMLSyntaxError as e:
+            raise ResponseException(HttpResponseBadRequest("Invalid XML body: %s" % e))
+
     def options(self, request, path, *args, **kwargs):
         if not self.has_access(self.resource, "read"):
             return self.no_access()
@@ -166,6 +272,7 @@ class DavView(TemplateView):
             "MOVE",
             "PUT",
             "MKCOL",
+            "REPORT",
         ]
 
         return allowed
@@ -386,8 +493,12 @@ class DavView(TemplateView):
         if not self.has_access(self.resource, "delete"):
             return self.no_access()
         self.lock_class(self.resource).del_locks()
-        self.resource.delete()
-        response = HttpResponseNoContent()
+        errors = self.resource.delete()
+        if errors:
+            log.warning("delete of %s failed for %d members", path, len(errors))
+            response = self.build_errors_response(errors)
+        else:
+            response = HttpResponseNoContent()
         self.__dict__["resource"] = self.get_resource(
             path=self.resource.get_path(), user=self.user
         )
@@ -468,13 +579,17 @@ class DavView(TemplateView):
         if dst_exists:
             self.lock_class(self.resource).del_locks()
             self.lock_class(dst).del_locks()
-            dst.delete()
+            errors = dst.delete()
+            if errors:
+                # relocating into the leftovers would mix old and new content
+                log.warning(
+                    "Overwriting %s failed for %d members", dst.get_path(), len(errors)
+                )
+                return self.build_errors_response(errors)
         errors = getattr(self.resource, method)(dst, *args, **kwargs)
         if errors:
-            log.warn(errors)
-            return self.build_xml_response(
-                response_class=HttpResponseMultiStatus
-            )  # WAT?
+            log.warning("%s of %s failed for %d members", method, path, len(errors))
+            return self.build_errors_response(errors)
         if dst_exists:
             return HttpResponseNoContent()
 
@@ -483,6 +598,22 @@ class DavView(TemplateView):
         response["Location"] = original_dst
         return response
 
+    def build_errors_response(self, errors):
+        """Build the multistatus listing the members a DELETE, COPY or MOVE failed
+        for, given as (resource, status) pairs."""
+        return self.build_xml_response(
+            D.multistatus(
+                *[
+                    D.response(
+                        D.href(url_join(self.base_url, r.get_escaped_path())),
+                        D.status(status),
+                    )
+                    for r, status in errors
+                ]
+            ),
+            HttpResponseMultiStatus,
+        )
+
     def copy(self, request, path, xbody):
         """
         Copy an element
@@ -547,14 +678,14 @@ class DavView(TemplateView):
         except IndexError:
             return HttpResponseBadRequest("Lock scope required")
         else:
-            lockscope = lockscope_obj.xpath("local-name()")
+            lockscope = etree.QName(lockscope_obj).localname
 
         try:
             locktype_obj = xbody("/D:lockinfo/D:locktype/*")[0]  # TODO: WEBDAV_NS
         except IndexError:
             return HttpResponseBadRequest("Lock type required")
         else:
-            locktype = locktype_obj.xpath("local-name()")
+            locktype = etree.QName(locktype_obj).localname
 
         token = self.lock_class(self.resource).acquire(
             lockscope, locktype, depth, timeout, owner
@@ -598,50 +729,417 @@ class DavView(TemplateView):
         if not self.get_access(self.resource):
             return self.no_access()
 
-        get_all_props, get_prop, get_prop_names = True, False, False
+        get_prop, get_prop_names = False, False
         if xbody:
-            get_prop = [p.xpath("local-name()") for p in xbody("/D:propfind/D:prop/*")]
-            get_all_props = xbody("/D:propfind/D:allprop")
-            get_prop_names = xbody("/D:propfind/D:propname")
-            if (
-                int(bool(get_prop))
-                + int(bool(get_all_props))
-                + int(bool(get_prop_names))
-                != 1
+            get_prop, get_prop_names = self.get_requested_props(xbody, "/D:propfind")
+
+        depth = self.get_depth()
+        if depth == -1 and not self.propfind_infinite_depth:
+            self.propfind_depth_limited("rejected", "infinite-depth")
+            return self.build_xml_response(
+                D.error(D("propfind-finite-depth")), HttpResponseForbidden
+            )
+
+        page_size = start_after = None
+        if self.propfind_pagination and depth == 1:
+            page_size = self.get_propfind_page_size(xbody)
+            if page_size:
+                start_after = self.get_propfind_page_start()
+
+        # the validator of a budgeted Depth: infinity PROPFIND would walk the whole
+        # tree before the budget applies, and the one of a page the whole collection,
+        # so such responses are sent without one
+        limited = depth == -1 and self.has_propfind_budget()
+        etag = None
+        if self.propfind_conditional and not limited and not page_size:
+            etag = self.get_propfind_etag(depth, get_prop, get_prop_names)
+            if etag is not None and self.accepts_xml_compression():
+                # compressed and identity bodies differ byte-wise, so like
+                # GZipMiddleware the validator of such a response is weak
+                etag = "W/" + etag
+            if etag is not None and etag_matches(
+                etag, request.META.get("HTTP_IF_NONE_MATCH")
             ):
-                return HttpResponseBadRequest()
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                return response
 
-        children = self.resource.get_descendants(depth=self.get_depth())
+        next_page_token = None
+        if page_size:
+            children = list(
+                self.resource.get_children(start_after=start_after, limit=page_size + 1)
+            )
+            if len(children) > page_size:
+                children = children[:page_size]
+                next_page_token = encode_page_token(children[-1].displayname)
+            if start_after is None:
+                children.insert(0, self.resource)
+        else:
+            children = self.resource.get_descendants(depth=depth)
 
-        if get_prop_names:
-            responses = [
-                D.response(
-                    D.href(url_join(self.base_url, child.get_escaped_path())),
-                    D.propstat(
-                        D.prop(*[D(name) for name in child.ALL_PROPS]),
-                        D.status("HTTP/1.1 200 OK"),
-                    ),
+        response = self.build_propfind_response(
+            children,
+            get_prop,
+            get_prop_names,
+            limited=limited,
+        )
+        if etag is not None:
+            response["ETag"] = etag
+        if next_page_token is not None:
+            response["X-Next-Page-Token"] = next_page_token
+        return response
+
+    def get_requested_props(self, xbody, root):
+        """Return the D:prop names and the D:propname flag requested by the body
+        element at root, which must ask for exactly one of prop, allprop or propname."""
+        get_prop = [etree.QName(p).localname for p in xbody(root + "/D:prop/*")]
+        get_all_props = xbody(root + "/D:allprop")
+        get_prop_names = xbody(root + "/D:propname")
+        if (
+            int(bool(get_prop)) + int(bool(get_all_props)) + int(bool(get_prop_names))
+            != 1
+        ):
+            raise ResponseException(HttpResponseBadRequest())
+        return get_prop, get_prop_names
+
+    def get_propfind_page_size(self, xbody=None):
+        """Return the requested page size of a paginated PROPFIND, taken from the
+        X-Page-Size header or a DASL-style D:limit/D:nresults element in the body."""
+        page_size = self.request.META.get("HTTP_X_PAGE_SIZE")
+        if page_size is None and xbody:
+            page_size = xbody("string(/D:propfind/D:limit/D:nresults)") or None
+        if page_size is None:
+            return None
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            page_size = 0
+        if page_size < 1:
+            raise ResponseException(
+                HttpResponseBadRequest("Invalid page size %s" % page_size)
+            )
+        if self.propfind_max_page_size is not None:
+            page_size = min(page_size, self.propfind_max_page_size)
+        return page_size
+
+    def get_propfind_page_start(self):
+        """Return the name of the child after which the requested page starts."""
+        token = self.request.META.get("HTTP_X_PAGE_TOKEN")
+        if not token:
+            return None
+        try:
+            return decode_page_token(token)
+        except ValueError:
+            raise ResponseException(HttpResponseBadRequest("Invalid page token"))
+
+    def build_propfind_response(
+        self, children, get_prop=None, get_prop_names=False, limited=False, statuses=()
+    ):
+        """Build the multistatus response listing the properties of children,
+        followed by a status-only response for each (href, status) in statuses."""
+        href = url_join(self.base_url, self.resource.get_escaped_path())
+
+        if (
+            self.propfind_fast_serializer
+            or self.propfind_cache is not None
+            or (limited and self.propfind_max_memory)
+        ):
+            serializer = MultistatusSerializer(self.xml_encoding, self.xml_pretty_print)
+            fragments = self.iter_propfind_fragments(
+                serializer, children, get_prop, get_prop_names
+            )
+            if limited:
+                fragments = self.limit_propfind(
+                    fragments,
+                    lambda: serializer.status_response(href, PROPFIND_PARTIAL_STATUS),
+                    size=len,
+                )
+            if statuses:
+                fragments = chain(
+                    fragments,
+                    (serializer.status_response(h, status) for h, status in statuses),
                 )
+            return self.build_serialized_multistatus_response(serializer, fragments)
+
+        responses = self.iter_propfind_responses(children, get_prop, get_prop_names)
+        if limited:
+            responses = self.limit_propfind(
+                responses,
+                lambda: D.response(D.href(href), D.status(PROPFIND_PARTIAL_STATUS)),
+            )
+        if statuses:
+            responses = chain(
+                responses,
+                (D.response(D.href(h), D.status(status)) for h, status in statuses),
+            )
+        if self.propfind_streaming:
+            return self.build_streaming_multistatus_response(responses)
+        body = D.multistatus(*responses)
+        return self.build_xml_response(body, HttpResponseMultiStatus)
+
+    def has_propfind_budget(self):
+        return (
+            self.propfind_max_entries is not None
+            or self.propfind_max_seconds is not None
+            or self.propfind_max_memory is not None
+        )
+
+    def limit_propfind(self, responses, partial, size=None):
+        """Pass through the responses of a Depth: infinity PROPFIND until the entry,
+        time or memory budget is exhausted. In that case a last response built by
+        partial() marks the multistatus as incomplete (507 for the request-URI)."""
+        started = time.monotonic()
+        entries = 0
+        memory = 0
+        for response in responses:
+            reason = None
+            if (
+                self.propfind_max_entries is not None
+                and entries >= self.propfind_max_entries
+            ):
+                reason = "entries"
+            elif (
+                self.propfind_max_seconds is not None
+                and time.monotonic() - started > self.propfind_max_seconds
+            ):
+                reason = "time"
+            elif self.propfind_max_memory is not None and size is not None:
+                memory += size(response)
+                if memory > self.propfind_max_memory:
+                    reason = "memory"
+            if reason:
+                self.propfind_depth_limited("truncated", reason)
+                yield partial()
+                return
+            entries += 1
+            yield response
+
+    def propfind_depth_limited(self, action, reason):
+        log.warning(
+            "PROPFIND %s for %s (%s), user agent %s",
+            action,
+            self.path,
+            reason,
+            self.request.META.get("HTTP_USER_AGENT"),
+        )
+        signals.propfind_depth_limited.send(
+            sender=self.__class__,
+            request=self.request,
+            path=self.path,
+            action=action,
+            reason=reason,
+        )
+
+    def iter_propfind_batches(self, children):
+        """Split the resources of a PROPFIND in lists of propfind_batch_size. Each
+        batch is loaded with bulk_prefetch first, and resources that don't exist
+        anymore, e.g. deleted since they were listed, are left out."""
+        children = iter(children)
+        while batch := list(islice(children, self.propfind_batch_size)):
+            type(batch[0]).bulk_prefetch(batch)
+            batch = [child for child in batch if child.exists]
+            if batch:
+                yield batch
+
+    def get_propfind_properties(
+        self, children, get_prop=None, get_prop_names=False, locks=None
+    ):
+        """Return the requested properties of each of the resources as lists of
+        (name, value) pairs. Live properties are computed once per resource, with a
+        single bulk_properties call for the whole batch, and so are the locks."""
+        if not children:
+            return []
+        lock_props = self.get_propfind_lock_props(get_prop, get_prop_names)
+        if get_prop_names:
+            return [
+                [(name, None) for name in child.ALL_PROPS + lock_props]
                 for child in children
             ]
+        names = (
+            [name for name in get_prop if name not in lock_props] if get_prop else None
+        )
+        if names == []:
+            props = [[] for child in children]
         else:
-            responses = [
-                D.response(
-                    D.href(url_join(self.base_url, child.get_escaped_path())),
-                    D.propstat(
-                        D.prop(
-                            *get_property_tag_list(
-                                child, *(get_prop if get_prop else child.ALL_PROPS)
-                            )
-                        ),
-                        D.status("HTTP/1.1 200 OK"),
-                    ),
+            props = type(children[0]).bulk_properties(children, names)
+        if not lock_props:
+            return props
+        if locks is None:
+            locks = self.get_propfind_locks(children, get_prop, get_prop_names)
+        return [
+            child_props + self.get_lock_properties(lock_props, child_locks)
+            for child_props, child_locks in zip(props, locks)
+        ]
+
+    def get_propfind_lock_props(self, get_prop=None, get_prop_names=False):
+        """Return the lock properties requested by a PROPFIND; they are only reported
+        by views with a lock_class."""
+        if self.lock_class is None:
+            return []
+        if get_prop and not get_prop_names:
+            return [name for name in LOCK_PROPERTIES if name in get_prop]
+        return list(LOCK_PROPERTIES)
+
+    def get_propfind_locks(self, children, get_prop=None, get_prop_names=False):
+        """Return the active locks of each of the resources if lockdiscovery is
+        requested, with one get_locks_for call for all of them, else None."""
+        if get_prop_names or "lockdiscovery" not in self.get_propfind_lock_props(
+            get_prop, get_prop_names
+        ):
+            return None
+        return self.lock_class.get_locks_for(children)
+
+    def get_lock_properties(self, lock_props, locks=None):
+        """Build the supportedlock and lockdiscovery (name, value) pairs."""
+        props = []
+        for name in lock_props:
+            if name == "supportedlock":
+                value = [
+                    (
+                        "lockentry",
+                        [("lockscope", [(scope, None)]), ("locktype", [(type_, None)])],
+                    )
+                    for scope, type_ in self.lock_class.supported_locks
+                ]
+            else:
+                value = [self.get_activelock(lock) for lock in locks or []]
+            props.append((name, value))
+        return props
+
+    def get_activelock(self, lock):
+        """Describe a lock returned by the lock_class as an activelock (name, value) pair."""
+        value = [
+            ("locktype", [(lock["locktype"], None)]),
+            ("lockscope", [(lock["lockscope"], None)]),
+            ("depth", "infinity" if lock["depth"] == -1 else str(lock["depth"])),
+        ]
+        if lock.get("owner"):
+            value.append(("owner", str(lock["owner"])))
+        timeout = lock.get("timeout")
+        value.append(
+            ("timeout", "Infinite" if timeout is None else "Second-%s" % timeout)
+        )
+        value.append(("locktoken", [("href", "opaquelocktoken:%s" % lock["token"])]))
+        return ("activelock", value)
+
+    def iter_propfind_responses(self, children, get_prop=None, get_prop_names=False):
+        """Yield the D:response elements of the resources of a PROPFIND."""
+        for batch in self.iter_propfind_batches(children):
+            props = self.get_propfind_properties(batch, get_prop, get_prop_names)
+            for child, child_props in zip(batch, props):
+                yield self.propfind_response(child, child_props)
+
+    def propfind_response(self, child, props):
+        """Build the D:response element for a single resource of a PROPFIND."""
+        return D.response(
+            D.href(url_join(self.base_url, child.get_escaped_path())),
+            D.propstat(
+                D.prop(*[property_element(*prop) for prop in props]),
+                D.status("HTTP/1.1 200 OK"),
+            ),
+        )
+
+    def iter_propfind_fragments(
+        self, serializer, children, get_prop=None, get_prop_names=False
+    ):
+        """Yield the D:response of each resource of a PROPFIND serialized to bytes.
+        Fragments found in the fragment cache are reused, properties are only
+        computed for the resources that missed it."""
+        for batch in self.iter_propfind_batches(children):
+            hrefs = [url_join(self.base_url, c.get_escaped_path()) for c in batch]
+            keys = [None] * len(batch)
+            fragments = [None] * len(batch)
+            locks = self.get_propfind_locks(batch, get_prop, get_prop_names)
+            if self.propfind_cache is not None:
+                for i, child in enumerate(batch):
+                    keys[i] = self.get_propfind_cache_key(
+                        serializer,
+                        hrefs[i],
+                        child,
+                        get_prop,
+                        get_prop_names,
+                        locks=locks[i] if locks is not None else None,
+                    )
+                    if keys[i] is not None:
+                        fragments[i] = self.propfind_cache.get(keys[i])
+            missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+            if missing:
+                props = self.get_propfind_properties(
+                    [batch[i] for i in missing],
+                    get_prop,
+                    get_prop_names,
+                    locks=[locks[i] for i in missing] if locks is not None else None,
                 )
-                for child in children
+                for i, child_props in zip(missing, props):
+                    fragments[i] = serializer.response(hrefs[i], child_props)
+                    if keys[i] is not None:
+                        self.propfind_cache.set(keys[i], fragments[i])
+            yield from fragments
+
+    def get_propfind_props_key(self, get_prop=None, get_prop_names=False):
+        """Describe the requested property set as a string, for use in cache keys."""
+        if get_prop_names:
+            return "propname"
+        if get_prop:
+            return "prop:" + ",".join(get_prop)
+        return "allprop"
+
+    def get_propfind_etag(self, depth, get_prop=None, get_prop_names=False):
+        """Return the entity tag of a PROPFIND multistatus response, derived from the
+        tree validator of the resource and the requested depth and properties, and
+        from the lock store version if lockdiscovery is requested. Returns None
+        if the lock store has no version to offer."""
+        key = "\0".join(
+            [
+                url_join(self.base_url, self.resource.get_escaped_path()),
+                str(depth),
+                self.get_propfind_props_key(get_prop, get_prop_names),
+                str(self.resource.get_tree_etag(depth=depth)),
             ]
-
-        body = D.multistatus(*responses)
-        return self.build_xml_response(body, HttpResponseMultiStatus)
+        )
+        if not get_prop_names and "lockdiscovery" in self.get_propfind_lock_props(
+            get_prop, get_prop_names
+        ):
+            version = self.lock_class.get_tree_version(self.resource, depth)
+            if version is None:
+                return None
+            key += "\0" + str(version)
+        return '"%s"' % md5(key.encode("utf-8")).hexdigest()
+
+    def get_propfind_cache_validator(self, child):
+        """Return a value that changes whenever the properties of the resource change,
+        or None if the resource can't be cached."""
+        try:
+            return child.getetag
+        except NotImplementedError:
+            pass
+        if child.is_root:
+            # the modification time of a root isn't always stored (see get_tree_etag)
+            return None
+        try:
+            return child.get_modified()
+        except NotImplementedError:
+            return None
+
+    def get_propfind_cache_key(
+        self, serializer, href, child, get_prop=None, get_prop_names=False, locks=None
+    ):
+        """Build the fragment cache key from the resource path, the requested
+        properties, the validator of the resource and its locks, if reported."""
+        validator = self.get_propfind_cache_validator(child)
+        if validator is None:
+            return None
+        key = "\0".join(
+            [
+                serializer.encoding,
+                str(serializer.pretty_print),
+                href,
+                self.get_propfind_props_key(get_prop, get_prop_names),
+                str(validator),
+                repr(locks),
+            ]
+        )
+        return md5(key.encode("utf-8")).hexdigest()
 
     def proppatch(self, request, path, xbody, *args, **kwargs):
         if not self.resource.exists:
@@ -663,6 +1161,85 @@ class DavView(TemplateView):
         )
         return self.build_xml_response(body, HttpResponseMultiStatus)
 
+    def report(self, request, path, xbody=None, *args, **kwargs):
+        """REPORT with a D:multiget body ({DAV:}multiget): return the requested
+        properties of every D:href in one multistatus. The hrefs are resolved
+        together through resource_class.bulk_prefetch; hrefs that are missing,
+        unreadable or outside this view get a 404 or 403 response of their own. Other
+        reports, e.g. CalDAV's calendar-multiget, are refused with
+        DAV:supported-report."""
+        if not self.has_access(self.resource, "read"):
+            return self.no_access()
+        if not xbody or xbody("/*")[0].tag != MULTIGET_REPORT:
+            return self.build_xml_response(
+                D.error(D("supported-report")), HttpResponseForbidden
+            )
+        get_prop, get_prop_names = self.get_requested_props(xbody, "/*")
+
+        resources, statuses = [], []
+        for href in xbody("/*/D:href/text()"):
+            href = href.strip()
+            resource_path = self.get_href_path(href)
+            if resource_path is None:
+                statuses.append((href, "HTTP/1.1 404 Not Found"))
+                continue
+            resources.append(
+                (href, self.get_resource(path=resource_path, user=self.user))
+            )
+        self.resource_class.bulk_prefetch([resource for _, resource in resources])
+
+        children = []
+        for href, resource in resources:
+            if not resource.exists:
+                statuses.append((href, "HTTP/1.1 404 Not Found"))
+            elif not self.has_access(resource, "read"):
+                statuses.append((href, "HTTP/1.1 403 Forbidden"))
+            else:
+                children.append(resource)
+        return self.build_propfind_response(
+            children, get_prop, get_prop_names, statuses=statuses
+        )
+
+    def get_href_path(self, href):
+        """Return the resource path of a request href, or None if it points outside
+        this view. Unlike the request URL, hrefs in a body aren't normalized by the
+        web server, so hrefs with . or .. segments are refused."""
+        path = urlparse.unquote(urlparse.urlparse(href).path)
+        if any(part in (".", "..") for part in path.split("/")):
+            return None
+        normalized = posixpath.normpath(path)
+        if path.endswith("/") and normalized != "/":
+            normalized += "/"
+        base_url = self.base_url.rstrip("/")
+        if not normalized.startswith(base_url + "/"):
+            return None
+        return normalized[len(base_url) :] or "/"
+
+    def build_serialized_multistatus_response(self, serializer, fragments):
+        """Wrap pre-serialized D:response fragments in a (streaming) multistatus response."""
+        content_type = 'text/xml; charset="%s"' % self.xml_encoding
+        if self.propfind_streaming:
+            response = StreamingHttpResponseMultiStatus(
+                serializer.iter_document(fragments), content_type=content_type
+            )
+        else:
+            response = HttpResponseMultiStatus(
+                serializer.document(fragments), content_type=content_type
+            )
+        return self.compress_xml_response(response)
+
+    def build_streaming_multistatus_response(self, responses):
+        """Stream a multistatus body, serializing each D:response as it is produced."""
+        response = StreamingHttpResponseMultiStatus(
+            iter_multistatus(
+                responses,
+                encoding=self.xml_encoding,
+                pretty_print=self.xml_pretty_print,
+            ),
+            content_type='text/xml; charset="%s"' % self.xml_encoding,
+        )
+        return self.compress_xml_response(response)
+
     def build_xml_response(self, tree=None, response_class=HttpResponse, **kwargs):
         if tree is not None:
             content = etree.tostring(
@@ -673,6 +1250,45 @@ class DavView(TemplateView):
             )
         else:
             content = b""
-        return response_class(
+        response = response_class(
             content, content_type='text/xml; charset="%s"' % self.xml_encoding, **kwargs
         )
+        return self.compress_xml_response(response)
+
+    def accepts_xml_compression(self):
+        """Return True if XML responses to this request may be compressed."""
+        return self.xml_compression and (
+            negotiate_content_coding(self.request.META.get("HTTP_ACCEPT_ENCODING", ""))
+            is not None
+        )
+
+    def compress_xml_response(self, response):
+        """Compress an XML response with the content coding the client prefers, if
+        xml_compression is enabled. Streaming responses are compressed on the fly,
+        others only when they are at least xml_compression_min_size bytes long."""
+        if not self.xml_compression or response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and not response.content:
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < self.xml_compression_min_size
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = negotiate_content_coding(
+            self.request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = iter_compressed(
+                response.streaming_content, coding, self.xml_compression_level
+            )
+        else:
+            response.content = compress(
+                response.content, coding, self.xml_compression_level
+            )
+            response["Content-Length"] = str(len(response.content))
+        response["Content-Encoding"] = coding
+        return response